@@ -7,15 +7,31 @@ Created on Tue Mar 11 09:22:13 2025
 
 from fileloadCHI import FileLoaderCHI
 from folderselector import FolderSelector
+from filescan import FolderScanner
 import pandas as pd
 import numpy as np
 # 如果只是需要一个NaN值, 可以选择math.nan.
 # 如果在数据科学项目中使用 pandas, 推荐使用 np.nan
 import os
+import sys
+import tempfile
+
+# 流式降采样模块位于EIS-CP_data_sampling文件夹中
+SAMPLING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'EIS-CP_data_sampling')
 
 class MainApp:
+    # 长时间CA/CP数据的降采样方法: None(不降采样)/'log'/'lttb'/'event'
+    sample_method = None
+    sample_points = 2000  # lttb方法的目标点数
+    sample_types = ('CA', 'CP')
+    # 数据量超过内存时启用: 逐个文件读取并暂存到磁盘，按行块写出合并表格
+    out_of_core = False
+    block_rows = 100000  # 每次写出的行数
+    preview_rows = 20000  # 窗口绘图所用的最大行数
+
     def __init__(self):
         self.fl = FileLoaderCHI()
+        self.scanner = FolderScanner(extensions=('.txt', '.csv'))
         self.folder_selector = FolderSelector(self.process_data)
         self.folder_selector.mainloop()
 
@@ -25,6 +41,12 @@ class MainApp:
             for subfolder in all_subfolders:
                 file_timestamps = self.get_file_timestamps(subfolder)
                 sorted_files = sorted(file_timestamps, key=lambda x: x[1])
+                if self.out_of_core:
+                    # 合并表格已直接写入文件，data仅为绘图用的抽稀数据
+                    n, data, plt_name = self.merge_sorted_files(sorted_files, subfolder, button_text)
+                    if n > 0:
+                        self.folder_selector.plot_in_window(n, plt_name, data)
+                    continue
                 n, data, plt_name = self.process_sorted_files(sorted_files, subfolder, button_text)
                 if n > 0:
                     self.save_data_to_csv(data, subfolder, button_text)
@@ -44,12 +66,11 @@ class MainApp:
 
     def get_file_timestamps(self, subfolder):
         file_timestamps = []
-        for f in os.listdir(subfolder):
-            if f.endswith('.txt') or f.endswith('.csv'):
-                file_path = os.path.join(subfolder, f)
-                timestamp = self.fl.get_file_timestamp(file_path)
-                if timestamp is not None:
-                    file_timestamps.append((f, timestamp))
+        # 跳过子文件夹及已合并的输出文件
+        for file_path in self.scanner.list_files(subfolder):
+            timestamp = self.fl.get_file_timestamp(file_path)
+            if timestamp is not None:
+                file_timestamps.append((os.path.basename(file_path), timestamp))
         return file_timestamps
 
     def process_sorted_files(self, sorted_files, subfolder, button_text):
@@ -61,7 +82,10 @@ class MainApp:
             fname = os.path.join(subfolder, name)
             
             try:
-                x, y, plt_name = self.fl.get_data(button_text, fname)
+                if self.sample_method and button_text in self.sample_types:
+                    x, y, plt_name = self.get_sampled_data(button_text, fname)
+                else:
+                    x, y, plt_name = self.fl.get_data(button_text, fname)
                 data[prefix + '_x'] = x
                 data[prefix + '_y'] = y
                 n += 1
@@ -82,10 +106,103 @@ class MainApp:
         
         return n, data, plt_name
 
+    def keep_all_x(self, button_text):
+        """是否保留每个文件的x轴（EIS或ZView数据强制保留所有x轴）"""
+        return not self.folder_selector.as_one or button_text in ('EIS', 'ZView')
+
+    def merge_sorted_files(self, sorted_files, subfolder, button_text):
+        """
+        核外合并: 每次只读取一个文件，各列暂存为.npy，再按行块写出合并表格
+
+        峰值内存约为单个文件加一个输出块；as_one时除第一个文件外不保存x轴。
+
+        返回:
+        tuple: (成功读取的文件数, 抽稀后的绘图数据, plt_name)
+        """
+        n = 0
+        plt_name = button_text
+        columns = {}  # 列名 -> (暂存文件, 长度)，同名列与字典写法一致地覆盖
+        keep_x = self.keep_all_x(button_text)
+        with tempfile.TemporaryDirectory(dir=subfolder) as tmp_dir:
+            for name, _ in sorted_files:
+                prefix = os.path.splitext(name)[0]
+                fname = os.path.join(subfolder, name)
+                try:
+                    if self.sample_method and button_text in self.sample_types:
+                        x, y, plt_name = self.get_sampled_data(button_text, fname)
+                    else:
+                        x, y, plt_name = self.fl.get_data(button_text, fname)
+                    pairs = [('_x', x), ('_y', y)] if keep_x or n == 0 else [('_y', y)]
+                    for suffix, values in pairs:
+                        path = os.path.join(tmp_dir, f'{len(columns)}.npy')
+                        np.save(path, np.asarray(values, dtype=float))
+                        columns[prefix + suffix] = (path, len(values))
+                    n += 1
+                except Exception as e:
+                    print(f"Error processing {fname}: {e}\n")
+                    continue
+                finally:
+                    x = y = None
+
+            if n == 0:
+                return n, {}, plt_name
+            out_file = os.path.join(subfolder, f'{button_text}_merged.txt')
+            self.write_blocks(columns, out_file)
+            preview = self.preview_columns(columns, keep_x)
+        return n, preview, plt_name
+
+    def write_blocks(self, columns, out_file):
+        """按行块写出合并表格，较短的列在各块中以NaN补齐"""
+        names = list(columns)
+        n_rows = max(length for _, length in columns.values())
+        tmp_file = f'{out_file}.tmp'
+        with open(tmp_file, 'w', newline='') as f:
+            for start in range(0, max(n_rows, 1), self.block_rows):
+                stop = min(start + self.block_rows, n_rows)
+                block = np.full((stop - start, len(names)), np.nan)
+                for j, (path, length) in enumerate(columns.values()):
+                    if length > start:
+                        block[:min(stop, length) - start, j] = \
+                            np.load(path, mmap_mode='r')[start:stop]
+                pd.DataFrame(block, columns=names).to_csv(
+                    f, sep='\t', index=False, header=start == 0)
+        os.replace(tmp_file, out_file)
+
+    def preview_columns(self, columns, keep_x):
+        """
+        按固定步长抽取不超过preview_rows行的绘图数据，并与process_sorted_files一样以NaN补齐
+
+        未保存x轴的文件共用第一个文件的x轴，以保持 _x/_y 成对的结构
+        """
+        n_rows = max(length for _, length in columns.values())
+        step = max(1, -(-n_rows // self.preview_rows))
+        n_preview = -(-n_rows // step)
+        preview = {}
+        first_x = None
+        for key, (path, _) in columns.items():
+            values = np.full(n_preview, np.nan)
+            part = np.load(path, mmap_mode='r')[::step]
+            values[:len(part)] = part
+            del part
+            if key.endswith('_x'):
+                first_x = values if first_x is None else first_x
+            elif not keep_x and key[:-2] + '_x' not in columns:
+                preview[key[:-2] + '_x'] = first_x
+            preview[key] = values
+        return preview
+
+    def get_sampled_data(self, button_text, fname):
+        """流式读取并降采样长时间序列文件，避免整个文件载入内存"""
+        if SAMPLING_DIR not in sys.path:
+            sys.path.insert(0, SAMPLING_DIR)
+        import sampling
+        x, y, _ = sampling.get_data(fname, self.sample_method, self.sample_points)
+        return x, y, button_text
+
     def save_data_to_csv(self, data, subfolder, button_text):
         df = pd.DataFrame(data)
         # 仅保留第一个x轴时启用（EIS或ZView数据强制保留所有x轴）
-        if self.folder_selector.as_one and button_text != 'EIS' and button_text != 'ZView':
+        if not self.keep_all_x(button_text):
             df = df.iloc[:, [0, 1] + list(range(3, df.shape[1], 2))]
         df.to_csv(os.path.join(subfolder, f'{button_text}_merged.txt'),
                   sep='\t', index=False)
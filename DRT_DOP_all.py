@@ -6,55 +6,100 @@ Created on Thu Jul  3 10:02:22 2025
 """
 
 import os
+import sys
+import queue
+import threading
 import numpy as np
-import matplotlib.pyplot as plt
-from hybdrt.models import DRT
-from hybdrt.fileload_all_eis import EisDataReader  # 导入文件加载模块
-import pandas as pd
-from folderselector_all_filetype import FolderSelector
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+# 使用本仓库的读取模块: 经hybdrt包导入会先执行hybdrt/__init__，连带导入整个拟合栈
+from fileload_all_eis import EisDataReader, SpectrumCache  # 导入文件加载模块
+from filescan import FolderScanner
+from archivesource import is_archive, join_source, output_folder
+from timeindex import TimestampIndex, normalize_window
+from drt_peaks import peak_table, save_peak_table
+from drt_linear import linkk_scores
+from drt_pipeline import (FIXED_BASIS_TAU, fit_eis_tuple, predict_fit, resolve_lambdas,
+                          compute_ci, add_ci_columns, add_ci_summary, result_name,
+                          save_fit_tables, preview_fits, ridge_fits, build_fit_tables)
+
+# matplotlib、tkinter、hybdrt(cvxopt)均在首次用到时才导入，
+# 可用 python -X importtime DRT_DOP_all.py 查看各模块的导入耗时
+
+
+def get_pyplot():
+    """首次绘图时导入matplotlib并设置字体"""
+    import matplotlib.pyplot as plt
+    plt.rcParams['font.family'] = 'Microsoft YaHei'  # 使用微软雅黑字体
+    return plt
 
-plt.rcParams['font.family'] = 'Microsoft YaHei'  # 使用微软雅黑字体
 
 class AnalysisEIS:
     """电化学阻抗谱(EIS)分析类，用于DRT拟合和DOP分析"""
+    peak_analysis = True  # 拟合后批量识别DRT峰并输出峰跟踪表
+    peak_min_height = 0.05  # 峰高下限(相对于该谱最大峰高)
+    # 拟合前的Lin-KK检验: 相对残差均方根超过kk_threshold的谱按kk_action处理。
+    # RC单元数由μ判据限制，残差约1%以内视为满足KK关系；1%噪声约0.009，30%漂移约0.017
+    kk_threshold = 0.01  # None表示只记录不判断
+    kk_action = 'flag'  # 'flag'仅在汇总表中标记，'skip'不再拟合
+    # 先用粗网格岭回归给出预览图和临时表格，完整拟合在后台进行并逐个替换预览结果
+    preview = True
+    preview_poll_ms = 500  # 后台拟合结果的刷新间隔
+    # 不拟合DOP时，共用频率网格的谱以岭回归共用一次分解求解，不再逐谱调用hybdrt；
+    # 结果与hybdrt的不可互换，表格以_ridge区分；开启DOP时仍逐谱拟合
+    batch_solver = False
+
     def __init__(self):
+        from folderselector_all_filetype import FolderSelector
+
         try:
             self.fl = EisDataReader()
+            self.scanner = FolderScanner()
+            # 缓存已解析的谱，仅修改参数重新运行时不再重复读取文件
+            self.spectra = SpectrumCache(self.fl)
             self.folder_selector = FolderSelector(self.process_data, show_buttons=[])
             self.folder_selector.as_one = 'False'  # 改为布尔值
             self.folder_selector.flag_text = '是否开启DOP'
             self.folder_selector.as_one_fuc()
             self.canvas = None
+            self.plots = None  # 常驻的结果图，首次绘图时创建
+            self.plot_series = {}  # 谱名 -> (拟合结果, 绘图数据)，同一拟合结果不重复计算
+            self.background = None  # 预览之后进行完整拟合的后台线程
             self.folder_selector.mainloop()
         finally:
             self.cleanup()
     
     def cleanup(self):
         """清理资源"""
+        if getattr(self, 'plots', None) is not None:
+            self.plots.close()
+            self.plots = None
+        if 'matplotlib.pyplot' not in sys.modules:
+            return  # 从未绘图，无需导入matplotlib
         try:
-            plt.close('all')  # 关闭所有 matplotlib 图形
+            get_pyplot().close('all')  # 关闭所有 matplotlib 图形
         except Exception as e:
             print(f"Error in cleaning up Matplotlib source: {e}")
 
     def process_data(self):
         """处理选中的文件或文件夹中的数据"""
+        if self.background is not None:
+            print("后台完整拟合仍在进行，请等待完成后再运行")
+            return
         try:
             all_selected_items = self.folder_selector.get_selected_items()
             file_timestamps = []
-            if os.path.isdir(all_selected_items[0]):  # 如果是文件夹
+            # 如果是文件夹或压缩包(压缩包中的文件直接读取，无需解压)
+            if os.path.isdir(all_selected_items[0]) or is_archive(all_selected_items[0]):
                 folder_path = all_selected_items[0]
-                for f in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, f)
-                    try:
-                        timestamps = self.get_file_timestamps(file_path)
-                        file_timestamps.append((f, timestamps)) if timestamps else None
-                    except Exception as e:
-                        print(f"Error in process_data: {e}")
-                        continue
+                # 时间戳索引只读取新增或变化的文件，再按时间窗口选出需要拟合的谱
+                index = TimestampIndex(folder_path, reader=self.fl, scanner=self.scanner)
+                index.update()
+                window = normalize_window(getattr(self.folder_selector, 'time_window', None))
+                file_timestamps = index.select(**window)
+                selected_files = [join_source(folder_path, f) for f, _ in file_timestamps]
             
             else:
                 folder_path = os.path.dirname(all_selected_items[0])
+                selected_files = all_selected_items
                 for item in all_selected_items:
                     # file_path = os.path.join(folder_path, item)
                     try:
@@ -75,20 +120,117 @@ class AnalysisEIS:
                     #     print(f"Error in process_data: {e}")
                     #     continue
                 
+            self.spectra.retain(selected_files)  # 释放不在当前选择中的谱
             sorted_files = sorted(file_timestamps, key=lambda x: x[1])               
-            lambda_0 = self.folder_selector.lambda_value
-            fits, data, data_dop = self.process_sorted_files(sorted_files, folder_path, lambda_0)
-            plt_file_name = f'DRT_Fit_Results_{sorted_files[0][0].split(".")[0]}_λ={lambda_0}'
-            
-            self.save_data_to_txt(data, data_dop, folder_path, plt_file_name)
-            
-            if fits:
-                self.plot_out_window(fits, plt_file_name, folder_path)
+            # 自动选择模式下lambda_0为准则名称，由每个谱分别确定
+            if self.folder_selector.lambda_mode == 'fixed':
+                lambda_0 = self.folder_selector.lambda_value
+            else:
+                lambda_0 = self.folder_selector.lambda_mode
+            if self.preview:
+                self.start_preview(sorted_files, folder_path, lambda_0)
+                return
+            results = self.process_sorted_files(sorted_files, folder_path, lambda_0)
+            self.finish_fits(results, sorted_files, folder_path, lambda_0)
         except Exception as e:
             print(f"Error in process_data: {e}")
         finally:
             self.clear_temporary_data()
 
+    def finish_fits(self, results, sorted_files, folder_path, lambda_0):
+        """保存完整拟合的结果表格、峰跟踪表并绘图"""
+        fits, data, data_dop, summary, ci = results
+        plt_file_name = result_name(sorted_files[0][0], lambda_0)
+        if set(summary['model']) - {''} == {'ridge'}:
+            # 全部为batch_solver的岭回归结果，lambda为岭回归自身的尺度，文件名与hybdrt结果区分
+            plt_file_name = result_name(sorted_files[0][0], lambda_0) + '_ridge'
+        out_folder = output_folder(folder_path)  # 压缩包的结果写在压缩包旁边
+
+        self.save_data_to_txt(data, data_dop, out_folder, plt_file_name, summary)
+        if self.peak_analysis and fits:
+            self.save_peaks(data, summary, dict(sorted_files), out_folder, plt_file_name)
+
+        if fits:
+            self.plot_out_window(fits, plt_file_name, folder_path, ci)
+
+    def start_preview(self, sorted_files, folder_path, lambda_0):
+        """
+        先对全部谱做粗网格岭回归预览，绘图并写出 *_preview 临时表格，
+        再在后台线程中进行完整拟合，结果由poll_background定时取回
+        """
+        eis_tups = self.load_spectra(sorted_files, folder_path)
+        plt_file_name = result_name(sorted_files[0][0], lambda_0)
+        try:
+            fits, lambdas = preview_fits(eis_tups)
+            records = [(name, ts, fits[name].predict_distribution(FIXED_BASIS_TAU), None,
+                        (lambdas[name], np.nan)) for name, ts in sorted_files if name in fits]
+            data, _, summary = build_fit_tables(records)
+            # 预览的lambda是岭回归自身按GCV选择的，与hybdrt的lambda不可比
+            summary = {'file': summary['file'], 'ridge_lambda': summary['iw_l2_lambda_0']}
+            save_fit_tables(data, None, output_folder(folder_path), f'{plt_file_name}_preview',
+                            summary)
+            self.plot_out_window(fits, plt_file_name, folder_path, eis_tups=eis_tups, save=False)
+            print(f"预览完成({len(fits)} 个谱)，后台进行完整拟合")
+        except Exception as e:
+            print(f"Error in preview fit: {e}")
+            fits = {}
+
+        updates = queue.Queue()
+
+        def work():
+            results = None
+            try:
+                # 传入副本: KK检验跳过的谱会从中删除，而主线程绘图仍在使用
+                results = self.process_sorted_files(
+                    sorted_files, folder_path, lambda_0, eis_tups=dict(eis_tups),
+                    on_fit=lambda name, fit: updates.put((name, fit)))
+            except Exception as e:
+                print(f"Error in background fit: {e}")
+            updates.put((None, results))
+
+        self.background = threading.Thread(target=work, daemon=True)
+        self.background.start()
+        self.folder_selector.after(self.preview_poll_ms, self.poll_background, updates,
+                                   fits, eis_tups, sorted_files, folder_path, lambda_0)
+
+    def poll_background(self, updates, fits, eis_tups, sorted_files, folder_path, lambda_0):
+        """在主线程中取回后台完成的拟合，替换对应的预览结果，全部完成后保存正式结果"""
+        changed, done, results = False, False, None
+        while True:
+            try:
+                name, item = updates.get_nowait()
+            except queue.Empty:
+                break
+            if name is None:
+                done, results = True, item
+            else:
+                fits[name] = item
+                changed = True
+
+        plt_file_name = result_name(sorted_files[0][0], lambda_0)
+        try:
+            if done:
+                self.background = None
+                if results is not None:
+                    self.finish_fits(results, sorted_files, folder_path, lambda_0)
+                    self.remove_preview(output_folder(folder_path), plt_file_name)
+                return
+            if changed:
+                self.plot_out_window(fits, plt_file_name, folder_path, eis_tups=eis_tups,
+                                     save=False)
+        except Exception as e:
+            print(f"Error in process_data: {e}")
+        self.folder_selector.after(self.preview_poll_ms, self.poll_background, updates,
+                                   fits, eis_tups, sorted_files, folder_path, lambda_0)
+
+    @staticmethod
+    def remove_preview(folder_path, plt_name):
+        """正式结果写出后删除预览表格"""
+        for suffix in ('_preview.txt', '_preview_summary.txt'):
+            path = os.path.join(folder_path, f'{plt_name}{suffix}')
+            if os.path.exists(path):
+                os.remove(path)
+
     def clear_temporary_data(self):
         """清除处理过程中创建的临时数据"""
         if hasattr(self, 'fits'):
@@ -130,152 +272,217 @@ class AnalysisEIS:
         # else:
         #     source = None
         # timestamp = self.fl.get_timestamp(file_path, source = source)
-        timestamp = self.fl.get_timestamp(file_path)
+        timestamp = self.spectra.get_timestamp(file_path)
 
         return timestamp
 
-    def process_sorted_files(self, sorted_files, subfolder, iw_l2_lambda_0):
-        """处理排序后的文件列表，进行DRT分析"""
+    def load_spectra(self, sorted_files, subfolder):
+        """读取全部谱，返回 文件名 -> (频率, 复数阻抗)"""
+        eis_tups = {}
+        if is_archive(subfolder):
+            # 一次读取压缩包中的全部谱，之后从缓存取得
+            self.spectra.load_archive(subfolder, [f for f, _ in sorted_files])
+        for txt_file, _ in sorted_files:
+            try:
+                eis_tups[txt_file] = self.spectra.get_eis_tuple(join_source(subfolder, txt_file))
+            except Exception as e:
+                print(f"Error processing {txt_file}: {e}")
+        return eis_tups
+
+    def process_sorted_files(self, sorted_files, subfolder, iw_l2_lambda_0, eis_tups=None,
+                             on_fit=None):
+        """
+        处理排序后的文件列表，进行DRT分析
+
+        eis_tups为已读取的谱(load_spectra的结果)，为None时在此读取；
+        on_fit(文件名, 拟合结果)在每个谱拟合完成后调用
+        """
         fits = {}
-        fixed_basis_tau = np.logspace(-7, 2, 181)
+        fixed_basis_tau = FIXED_BASIS_TAU
         data = {'0x': fixed_basis_tau}
         data_dop = None  # 默认为None
+        fit_dop = self.folder_selector.as_one
+        # 自动选择模式下DOP的lambda也按同一准则选择(与iw的lambda分别选择)
+        if isinstance(iw_l2_lambda_0, str):
+            dop_l2_lambda_0 = iw_l2_lambda_0
+        else:
+            dop_l2_lambda_0 = self.folder_selector.dop_value
+        # model为'hybdrt'或'ridge'(batch_solver)，岭回归的lambda与hybdrt的不可比，单列记录
+        summary = {'file': [], 'model': [], 'iw_l2_lambda_0': [], 'ridge_lambda': [],
+                   'dop_l2_lambda_0': [], 'kk_residual': [], 'kk_pass': []}
+
+        # 拟合前先读取全部谱，批量进行Kramers-Kronig检验
+        if eis_tups is None:
+            eis_tups = self.load_spectra(sorted_files, subfolder)
+        kk_scores = self.kk_screen(eis_tups)
+        batch_fits = {}
+        if self.batch_solver and not fit_dop:
+            batch_fits = self.batch_fit(eis_tups, kk_scores, iw_l2_lambda_0)
 
         # 对每个文件进行DRT分析
-        for txt_file, _ in sorted_files:
+        for txt_file, eis_tup in list(eis_tups.items()):
+            kk_score = kk_scores.get(txt_file, np.nan)
+            kk_pass = bool(self.kk_threshold is None or not kk_score > self.kk_threshold)
+            if not kk_pass and self.kk_action == 'skip':
+                print(f"跳过 {txt_file}: KK残差 {kk_score:.3g} 超过阈值 {self.kk_threshold}")
+                del eis_tups[txt_file]
+                summary['file'].append(txt_file)
+                summary['model'].append('')
+                summary['iw_l2_lambda_0'].append(np.nan)
+                summary['ridge_lambda'].append(np.nan)
+                summary['dop_l2_lambda_0'].append(np.nan)
+                summary['kk_residual'].append(kk_score)
+                summary['kk_pass'].append(kk_pass)
+                continue
             try:
-                file_path = os.path.join(subfolder, txt_file)
-                eis_tup = self.fl.get_eis_tuple(file_path)
-                # 动态传递参数
-                fit_kwargs = {'iw_l2_lambda_0': iw_l2_lambda_0, 'nonneg': False}
-                if self.folder_selector.as_one:
-                    fit_kwargs['dop_l2_lambda_0'] = self.folder_selector.dop_value
-                eis_drt = DRT(fit_dop=self.folder_selector.as_one, fixed_basis_tau=fixed_basis_tau)
-                eis_drt.dual_fit_eis(*eis_tup, **fit_kwargs)
+                if txt_file in batch_fits:
+                    eis_drt = batch_fits[txt_file]
+                    iw_lambda, dop_lambda = np.nan, dop_l2_lambda_0
+                else:
+                    iw_lambda, dop_lambda = resolve_lambdas(eis_tup, iw_l2_lambda_0,
+                                                            dop_l2_lambda_0, fit_dop,
+                                                            fixed_basis_tau)
+                    eis_drt = fit_eis_tuple(eis_tup, iw_lambda, fit_dop=fit_dop,
+                                            dop_l2_lambda_0=dop_lambda,
+                                            fixed_basis_tau=fixed_basis_tau)
                 
                 fits[txt_file] = eis_drt
-                data[txt_file] = eis_drt.predict_distribution(fixed_basis_tau)
+                if on_fit is not None:
+                    on_fit(txt_file, eis_drt)
+                gamma, nu, dop = predict_fit(eis_drt, fit_dop, fixed_basis_tau)
+                data[txt_file] = gamma
                 
                 # 仅在as_one为True时收集DOP数据
-                if self.folder_selector.as_one:
+                if fit_dop:
                     if data_dop is None:
                         data_dop = {'0x_dop': None}
-                    data_dop['0x_dop'], data_dop[txt_file] = eis_drt.predict_dop(
-                        normalize=True, return_nu=True)
+                    data_dop['0x_dop'], data_dop[txt_file] = nu, dop
+
+                summary['file'].append(txt_file)
+                summary['model'].append('ridge' if txt_file in batch_fits else 'hybdrt')
+                summary['iw_l2_lambda_0'].append(iw_lambda)
+                summary['ridge_lambda'].append(batch_fits[txt_file].lam if txt_file in batch_fits
+                                               else np.nan)
+                summary['dop_l2_lambda_0'].append(dop_lambda if fit_dop else np.nan)
+                summary['kk_residual'].append(kk_score)
+                summary['kk_pass'].append(kk_pass)
 
             except Exception as e:
                 print(f"Error processing {txt_file}: {e}")
                 continue
     
-        return fits, data, data_dop
+        # 一次性批量计算岭回归近似模型的区间，写入表格并供绘图复用
+        try:
+            ci = compute_ci({k: v for k, v in eis_tups.items() if k in data}, fixed_basis_tau)
+            data = add_ci_columns(data, ci)
+            add_ci_summary(summary, ci)
+        except Exception as e:
+            print(f"Error computing confidence intervals: {e}")
+            ci = None
+
+        return fits, data, data_dop, summary, ci
     
-    def plot_out_window(self, fits, plt_name, subfolder):
-        """绘制四个子图并分别设置标题：DRT、DOP、拟合结果、残差"""
-        plt.close('all')  # 关闭所有 matplotlib 图形
-        if self.canvas:
-            self.canvas.get_tk_widget().destroy()  # 销毁之前的绘图 canvas
+    def batch_fit(self, eis_tups, kk_scores, iw_l2_lambda_0):
+        """
+        不拟合DOP时，共用频率网格的谱共用一次分解求解，
+        返回 文件名 -> LinearDRTFit；失败时返回空字典，全部改为逐谱拟合
 
-        window_width = self.folder_selector.winfo_width()
-        window_height = self.folder_selector.winfo_height()
+        输入的数值lambda按岭回归自身的尺度使用，准则名称则各谱分别选择；
+        结果是岭回归模型的，与hybdrt的拟合不可互换，表格以_ridge区分
+        """
+        names = [n for n in eis_tups if self.kk_action != 'skip' or self.kk_threshold is None
+                 or not kk_scores.get(n, np.nan) > self.kk_threshold]
+        try:
+            fits, _ = ridge_fits({n: eis_tups[n] for n in names}, iw_l2_lambda_0,
+                                 FIXED_BASIS_TAU, shared=True)
+            return fits
+        except Exception as e:
+            print(f"Error in batch solve, falling back to per-spectrum fits: {e}")
+            return {}
 
-        fig_width = min(10, window_width / 100)
-        fig_height = min(8, window_height / 100)
+    def kk_screen(self, eis_tups):
+        """按频率网格分组批量计算Lin-KK相对残差，返回 文件名 -> 残差"""
+        try:
+            names = list(eis_tups)
+            scores = linkk_scores([eis_tups[n][0] for n in names],
+                                  [eis_tups[n][1] for n in names])
+            return dict(zip(names, scores))
+        except Exception as e:
+            print(f"Error in Kramers-Kronig screening: {e}")
+            return {}
+
+    def save_peaks(self, data, summary, timestamps, subfolder, plt_name):
+        """对全部DRT结果(谱 × tau矩阵)一次性识别峰并保存峰跟踪表"""
+        try:
+            names = [n for n in summary['file'] if n in data]
+            gamma = np.vstack([data[name] for name in names])
+            table = peak_table(gamma, FIXED_BASIS_TAU, names, [timestamps[n] for n in names],
+                               min_height=self.peak_min_height)
+            save_peak_table(table, subfolder, plt_name)
+        except Exception as e:
+            print(f"Error in peak analysis: {e}")
+
+    def plot_out_window(self, fits, plt_name, subfolder, ci=None, eis_tups=None, save=True):
+        """
+        绘制四个子图并分别设置标题：DRT、DOP、拟合结果、残差
+
+        图形和每个谱的曲线保留在self.plots中，再次运行时只更新新增或变化的谱。
+        ci为process_sorted_files中预先计算的近似模型区间；
+        eis_tups为已读取的谱，为None时从缓存读取；save为False时不保存图片(预览)
+        """
+        get_pyplot()  # 设置字体
+        from plot_manager import PlotManager, SpectrumSeries
 
-        # 创建 2x2 子图布局
-        fig, axes = plt.subplots(2, 2, figsize=(fig_width, fig_height))
-        axes = axes.flatten()  # 展平为一维数组
-        
-        # 子图标题列表
-        subplot_titles = ["DRT 分布", "DOP 分布", "EIS 拟合结果", "拟合残差"]
-        
-        # 确保至少有一个拟合结果
         if not fits:
-            for ax in axes:
-                ax.text(0.5, 0.5, "无数据可绘制", ha='center', va='center', fontsize=12)
-            plt.close(fig)
             return
-
-        # 颜色映射
-        colormap = plt.get_cmap("tab20c")
-        
-        # 绘制四个子图
-        for i, ax in enumerate(axes):
-            if i == 0:
-                # 子图1：DRT 分布
-                ax.set_title(subplot_titles[0], fontsize=12)
-                for idx, (label, fit) in enumerate(fits.items()):
-                    eis_fmt = dict(c=colormap(idx / len(fits)), alpha=0.7)
-                    fit.plot_distribution(ax=ax, label=label, plot_ci=True, 
-                                          ls='-.', **eis_fmt)
-                ax.legend(fontsize=4)
-                ax.set_xlim(1e-7, 1e2)
-                
-            elif i == 1:
-                # 子图2：DOP 分布
-                ax.set_title(subplot_titles[1], fontsize=12)
-                if self.folder_selector.as_one:
-                    for idx, (label, fit) in enumerate(fits.items()):
-                        if hasattr(fit, 'plot_dop'):
-                            eis_fmt = dict(c=colormap(idx / len(fits)), alpha=0.7)
-                            fit.plot_dop(ax=ax, label=label, plot_ci=True, normalize=True,
-                                         ls='-.', **eis_fmt)
-                        else:
-                            ax.text(0.5, 0.5, "无DOP数据", ha='center', va='center')
+        ci = ci or {}
+        series = {}
+        for label, fit in fits.items():
+            cached = self.plot_series.get(label)
+            if cached is not None and cached[0] is fit and cached[1] is ci.get(label):
+                series[label] = cached[2]
+                continue
+            try:
+                if eis_tups is not None:
+                    freq, z = eis_tups[label]
                 else:
-                    ax.text(0.5, 0.5, "DOP未开启", ha='center', va='center', transform=ax.transAxes )
-                ax.set_xlim(0, 90)
-                
-            elif i == 2:
-                # 子图3：EIS 拟合结果
-                ax.set_title(subplot_titles[2], fontsize=12)
-                for idx, (label, fit) in enumerate(fits.items()):
-                    eis_fmt = dict(c=colormap(idx / len(fits)), alpha=0.7)
-                    fit.plot_eis_fit(axes=axes[2], plot_type='nyquist', plot_data=True, 
-                                     data_kw=dict(color=colormap(idx / len(fits)), alpha=0.7), 
-                                     **eis_fmt)
-                                    
-            elif i == 3:
-                # 子图4：拟合残差
-                ax.set_title(subplot_titles[3], fontsize=12)
-                for idx, (label, fit) in enumerate(fits.items()):
-                    eis_fmt = dict(color=colormap(idx / len(fits)), alpha=0.7)
-                    fit.plot_eis_residuals(axes=axes[3], **eis_fmt,
-                                           plot_sigma=True, facecolors='none', part='imag', scale_prefix='')
-                if ax.get_legend():
-                    ax.get_legend().remove()
-
-            ax.grid(True, linestyle='--', alpha=0.5)
-        
-        # 保存图形
-        fig.savefig(os.path.join(subfolder, f'{plt_name}.png'), dpi=300)
-        fig.tight_layout()
-        # 嵌入到窗口
+                    freq, z = self.spectra.get_eis_tuple(join_source(subfolder, label))
+                s = SpectrumSeries(FIXED_BASIS_TAU, fit.predict_distribution(FIXED_BASIS_TAU),
+                                   freq, z, fit.predict_z(freq))
+                if label in ci:
+                    s.ci = (ci[label]['lo'], ci[label]['hi'])
+                if self.folder_selector.as_one and hasattr(fit, 'predict_dop'):
+                    nu, s.dop = fit.predict_dop(normalize=True, return_nu=True)
+                    s.dop_x = nu * -90
+            except Exception as e:
+                print(f"Error plotting {label}: {e}")
+                continue
+            series[label] = s
+            self.plot_series[label] = (fit, ci.get(label), s)
+        for label in [lb for lb in self.plot_series if lb not in fits]:
+            del self.plot_series[label]
+
+        # 嵌入到窗口，窗口中的画布被销毁后才重新创建
         try:
-            if self.folder_selector:
+            if self.plots is None or not self.plots.alive():
                 right_frame = self.folder_selector.right_frame
                 for widget in right_frame.winfo_children():
                     widget.destroy()
-                
-                self.canvas = FigureCanvasTkAgg(fig, master=right_frame)
-                self.canvas.draw()
-                self.canvas.get_tk_widget().pack(fill="both", expand=True)
-                
+                fig_width = min(10, self.folder_selector.winfo_width() / 100)
+                fig_height = min(8, self.folder_selector.winfo_height() / 100)
+                self.plots = PlotManager(right_frame, figsize=(fig_width, fig_height))
+                self.canvas = self.plots.canvas
+            changed = self.plots.update(series, dop_enabled=bool(self.folder_selector.as_one))
+            png_file = os.path.join(output_folder(subfolder), f'{plt_name}.png')
+            # 保存图形，结果未变化且图片已存在时跳过
+            if save and (changed != 'none' or not os.path.exists(png_file)):
+                self.plots.save(png_file, dpi=300)
         except Exception as e:
             print(f"图形嵌入错误: {e}")
-            plt.close(fig)
 
-    def save_data_to_txt(self, data, data_dop, subfolder, plt_name):
+    def save_data_to_txt(self, data, data_dop, subfolder, plt_name, summary=None):
         """将数据保存为txt文件"""
-        # 保存DRT数据
-        data_df = pd.DataFrame(data)
-        data_df.to_csv(os.path.join(subfolder, f'{plt_name}.txt'), 
-                       sep='\t', index=False)
-        if data_dop is None:
-            return
-        data_dop['0x_dop'] = data_dop['0x_dop'] * -90
-        data_dop_df = pd.DataFrame(data_dop)
-        data_dop_df.to_csv(os.path.join(subfolder, f'{plt_name}_dop.txt'), 
-                           sep='\t', index=False)
+        save_fit_tables(data, data_dop, subfolder, plt_name, summary)
 
 if __name__ == "__main__":
     app = AnalysisEIS()
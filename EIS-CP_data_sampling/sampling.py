@@ -1 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+长时间CHI计时电位(CP)/计时电流(CA)数据的流式降采样
 
+文件按块读取，内存占用只与块大小和输出点数有关，与文件长度无关。
+提供三种保形降采样方式:
+    log     对数时间采样，每十倍时间保留固定点数，适合弛豫过程
+    lttb    Largest-Triangle-Three-Buckets，按目标点数保留曲线形状
+    event   在电流/电位阶跃附近保留全部点，其余部分以阶跃时刻为起点做对数时间采样
+log和event的点数取决于数据本身，超过n_points时再对结果做一次LTTB，保证点数不超过n_points。
+"""
+
+import os
+import warnings
+from datetime import datetime
+from typing import Union, Optional
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+def read_chi_header(file: Union[Path, str], max_lines: int = 500) -> dict:
+    """
+    读取CHI时间序列文件的文件头
+
+    返回:
+    dict: timestamp(开始时间), technique(测试方法), params(形如"key = value"的参数),
+          names(数据列名), skiprows(数据起始行号)
+    """
+    header = {'timestamp': None, 'technique': None, 'params': {}, 'names': None, 'skiprows': None}
+    with open(file, 'r', encoding='latin1') as f:
+        for i, line in enumerate(f):
+            if i >= max_lines:
+                break
+            line = line.strip()
+            if i == 0:
+                header['timestamp'] = _parse_chi_time(line)
+                continue
+            if i == 1:
+                header['technique'] = line
+            if ' = ' in line:
+                key, value = line.split(' = ', 1)
+                try:
+                    header['params'][key.strip()] = float(value)
+                except ValueError:
+                    header['params'][key.strip()] = value.strip()
+            elif line.startswith('Time/'):
+                header['names'] = [n.strip() for n in line.split(',')]
+                header['skiprows'] = i + 1
+                break
+    if header['names'] is None:
+        raise ValueError(f"在文件 {Path(file).name} 中找不到 'Time/' 表头")
+    return header
+
+
+def _parse_chi_time(line: str) -> Optional[datetime]:
+    """解析CHI文件首行的时间戳"""
+    line = line.replace("May", "May.").replace("June", "Jun.").replace("July", "Jul.")
+    line = line.replace("Sept.", "Sep.")
+    try:
+        return datetime.strptime(line, "%b. %d, %Y %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def iter_chunks(file: Union[Path, str], header: Optional[dict] = None, chunk_rows: int = 200000):
+    """按块读取数据区，每次返回一个(行数 × 列数)的float64数组"""
+    if header is None:
+        header = read_chi_header(file)
+    reader = pd.read_csv(file, sep=',', skiprows=header['skiprows'], header=None,
+                         names=header['names'], skipinitialspace=True, skip_blank_lines=True,
+                         encoding='latin1', chunksize=chunk_rows)
+    with reader:
+        for chunk in reader:
+            yield chunk.to_numpy(dtype=np.float64)
+
+
+def count_rows(file: Union[Path, str], header: Optional[dict] = None, block_size: int = 1 << 20) -> int:
+    """不解析数值，按块统计数据区行数(LTTB需要预先知道总点数)"""
+    if header is None:
+        header = read_chi_header(file)
+    n_lines = 0
+    last = b'\n'
+    with open(file, 'rb') as f:
+        for _ in range(header['skiprows']):
+            f.readline()
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            n_lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        n_lines += 1
+    return n_lines
+
+
+class LogTimeSampler:
+    """对数时间采样：以t0为起点，每十倍时间保留points_per_decade个点"""
+    def __init__(self, points_per_decade: int = 50, time_col: int = 0,
+                 t0: Optional[float] = None, t_res: Optional[float] = None):
+        self.points_per_decade = points_per_decade
+        self.time_col = time_col
+        self.t0 = t0
+        self.t_res = t_res  # 时间分辨率，早于t0 + t_res的点只保留第一个
+        self.last_bucket = None
+        self.last_row = None
+        self.last_kept = False
+
+    def reset(self, t0: float) -> None:
+        """以新的起点重新开始对数采样(用于阶跃之后)"""
+        self.t0 = t0
+        self.last_bucket = None
+
+    def buckets(self, t: np.ndarray) -> np.ndarray:
+        elapsed = (t - self.t0) / self.t_res
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bucket = np.floor(np.log10(elapsed) * self.points_per_decade)
+        bucket[~(elapsed >= 1)] = -1
+        return bucket
+
+    def update(self, chunk: np.ndarray) -> np.ndarray:
+        """处理一个数据块，返回其中被保留的行"""
+        if len(chunk) == 0:
+            return chunk
+        t = chunk[:, self.time_col]
+        if self.t0 is None:
+            self.t0 = t[0]
+        if self.t_res is None:
+            dt = np.diff(t)
+            dt = dt[dt > 0]
+            self.t_res = dt.min() if len(dt) else 1.0
+        bucket = self.buckets(t)
+        keep = np.empty(len(t), dtype=bool)
+        keep[0] = bucket[0] != self.last_bucket
+        keep[1:] = bucket[1:] != bucket[:-1]
+        self.last_bucket = bucket[-1]
+        self.last_row = chunk[-1]
+        self.last_kept = bool(keep[-1])
+        return chunk[keep]
+
+    def finish(self) -> np.ndarray:
+        """保留最后一个点，保证曲线终点不丢失"""
+        if self.last_row is None or self.last_kept:
+            return np.empty((0, 0))
+        return self.last_row[None, :]
+
+
+class LTTBSampler:
+    """
+    流式LTTB降采样，只缓存当前桶和下一个桶的数据
+
+    参数:
+    n_out: 输出点数
+    n_total: 输入总点数，可由count_rows得到
+    """
+    def __init__(self, n_out: int, n_total: int, time_col: int = 0, value_col: int = 1):
+        if n_out < 3:
+            raise ValueError("LTTB输出点数至少为3")
+        self.n_out = n_out
+        self.n_total = n_total
+        self.time_col = time_col
+        self.value_col = value_col
+        self.every = (n_total - 2) / (n_out - 2)
+        self.k = 0              # 当前桶编号
+        self.rows_seen = 0
+        self.pending = None     # 尚未处理的行
+        self.pending_start = 0  # pending第一行的全局行号
+        self.prev = None        # 上一个保留的点
+        self.last_row = None
+
+    def _edge(self, k: int) -> int:
+        return min(int(k * self.every) + 1, self.n_total - 1)
+
+    def _select(self, final: bool = False) -> list:
+        out = []
+        n_buckets = self.n_out - 2
+        while self.k < n_buckets:
+            start, end = self._edge(self.k), self._edge(self.k + 1)
+            if self.k + 1 < n_buckets:
+                next_end = self._edge(self.k + 2)
+            else:
+                next_end = self.n_total
+            if next_end > self.rows_seen and not final:
+                break
+            next_end = min(next_end, self.rows_seen)
+            cur = self.pending[start - self.pending_start:end - self.pending_start]
+            nxt = self.pending[end - self.pending_start:next_end - self.pending_start]
+            if len(cur) == 0:
+                self.k += 1
+                continue
+            if len(nxt) == 0:
+                nxt = cur[-1:]
+            tx, ty = self.time_col, self.value_col
+            avg_t, avg_y = nxt[:, tx].mean(), nxt[:, ty].mean()
+            area = np.abs((self.prev[tx] - avg_t) * (cur[:, ty] - self.prev[ty])
+                          - (self.prev[tx] - cur[:, tx]) * (avg_y - self.prev[ty]))
+            self.prev = cur[np.argmax(area)]
+            out.append(self.prev)
+            self.k += 1
+            # 丢弃已处理的行
+            drop = end - self.pending_start
+            self.pending = self.pending[drop:]
+            self.pending_start = end
+        return out
+
+    def update(self, chunk: np.ndarray) -> np.ndarray:
+        """处理一个数据块，返回可以确定的保留行"""
+        if len(chunk) == 0:
+            return chunk
+        out = []
+        if self.rows_seen == 0:
+            self.prev = chunk[0]
+            out.append(chunk[0])
+            chunk = chunk[1:]
+            self.pending_start = 1
+            self.pending = chunk[:0]
+            self.rows_seen = 1
+        self.pending = np.concatenate([self.pending, chunk])
+        self.rows_seen += len(chunk)
+        if len(chunk):
+            self.last_row = chunk[-1]
+        out += self._select()
+        return np.array(out).reshape(len(out), -1)
+
+    def finish(self) -> np.ndarray:
+        """处理剩余的桶并保留最后一个点"""
+        if self.rows_seen < self.n_total:
+            # 预估总行数偏大(如文件末尾有非数据行)，按实际行数收尾
+            self.n_total = self.rows_seen
+        out = self._select(final=True) if self.pending is not None else []
+        if self.last_row is not None:
+            out.append(self.last_row)
+        return np.array(out).reshape(len(out), -1)
+
+
+class EventSampler:
+    """
+    保留阶跃事件的降采样：event_col的相邻点差值超过阈值视为阶跃，
+    阶跃前后window个点全部保留，其余点以最近一次阶跃为起点做对数时间采样
+
+    参数:
+    threshold: 阶跃阈值，为None时由第一个数据块的差分的中位绝对偏差自动估计
+    """
+    def __init__(self, event_col: int = 1, threshold: Optional[float] = None, window: int = 20,
+                 points_per_decade: int = 30, time_col: int = 0):
+        self.event_col = event_col
+        self.threshold = threshold
+        self.window = window
+        self.time_col = time_col
+        self.log_sampler = LogTimeSampler(points_per_decade, time_col=time_col)
+        self.tail = None        # 上一块末尾尚未判定的行
+        self.prev_value = None  # 已判定的最后一行的event_col值
+        self.after = 0          # 上一个阶跃之后还需保留的点数
+        self.n_events = 0
+
+    def _process(self, rows: np.ndarray, lookahead: int) -> np.ndarray:
+        """判定rows中除最后lookahead行以外的行"""
+        y = rows[:, self.event_col]
+        if self.threshold is None:
+            dy = np.diff(y)
+            mad = np.median(np.abs(dy - np.median(dy))) if len(dy) else 0.0
+            self.threshold = max(50 * mad, 0.02 * np.ptp(y), np.finfo(float).tiny)
+        n = len(rows) - lookahead
+        prev = y[0] if self.prev_value is None else self.prev_value
+        is_event = np.abs(np.diff(y, prepend=prev)) > self.threshold
+
+        keep = np.zeros(n, dtype=bool)
+        keep[:min(self.after, n)] = True
+        self.after = max(self.after - n, 0)
+        event_idx = np.flatnonzero(is_event)
+        for i in event_idx:
+            keep[max(i - self.window, 0):min(i + self.window, n)] = True
+        # 窗口跨越当前块末尾的阶跃
+        pending_events = event_idx[event_idx < n]
+        if len(pending_events):
+            self.after = max(self.after, pending_events[-1] + self.window - n)
+
+        # 两个阶跃之间的部分按对数时间采样
+        start = 0
+        for i in list(pending_events) + [n]:
+            seg = rows[start:i]
+            if len(seg):
+                log_keep = np.zeros(len(seg), dtype=bool)
+                sampled = self.log_sampler.update(seg)
+                if len(sampled):
+                    log_keep[np.searchsorted(seg[:, self.time_col], sampled[:, self.time_col])] = True
+                keep[start:i] |= log_keep
+            if i < n:
+                self.log_sampler.reset(rows[i, self.time_col])
+                self.n_events += 1
+            start = i
+        if n > 0:
+            self.prev_value = y[n - 1]
+        self.tail = rows[n:]
+        return rows[:n][keep]
+
+    def update(self, chunk: np.ndarray) -> np.ndarray:
+        """处理一个数据块，末尾window行留到下一块再判定"""
+        if len(chunk) == 0:
+            return chunk
+        rows = chunk if self.tail is None else np.concatenate([self.tail, chunk])
+        lookahead = min(self.window, len(rows))
+        return self._process(rows, lookahead)
+
+    def finish(self) -> np.ndarray:
+        if self.tail is None or len(self.tail) == 0:
+            return np.empty((0, 0))
+        out = self._process(self.tail, 0)
+        last = self.log_sampler.finish()
+        if len(last) and (len(out) == 0 or out[-1, self.time_col] != last[0, self.time_col]):
+            out = np.concatenate([out, last])
+        return out
+
+
+def make_sampler(method: str, file: Union[Path, str], header: dict, n_points: int = 2000,
+                 value_col: int = 1, **kwargs):
+    """按方法名创建采样器"""
+    if method == 'log':
+        return LogTimeSampler(**kwargs)
+    elif method == 'lttb':
+        return LTTBSampler(n_points, count_rows(file, header), value_col=value_col, **kwargs)
+    elif method == 'event':
+        return EventSampler(event_col=kwargs.pop('event_col', value_col), **kwargs)
+    raise ValueError(f"未知的采样方法 {method}，可选: log, lttb, event")
+
+
+def lttb(data: np.ndarray, n_out: int, time_col: int = 0, value_col: int = 1) -> np.ndarray:
+    """对已在内存中的数组做LTTB，点数不超过n_out时原样返回"""
+    if len(data) <= n_out:
+        return data
+    sampler = LTTBSampler(n_out, len(data), time_col=time_col, value_col=value_col)
+    return np.concatenate([sampler.update(data), sampler.finish()])
+
+
+def sample_file(file: Union[Path, str], method: str = 'lttb', n_points: int = 2000,
+                value_col: int = 1, chunk_rows: int = 200000, **kwargs):
+    """
+    流式降采样一个CHI时间序列文件，输出点数不超过n_points
+
+    返回:
+    tuple: (列名列表, 降采样后的(点数 × 列数)数组, 文件头)
+    """
+    header = read_chi_header(file)
+    sampler = make_sampler(method, file, header, n_points=n_points, value_col=value_col, **kwargs)
+    parts = []
+    for chunk in iter_chunks(file, header, chunk_rows):
+        kept = sampler.update(chunk)
+        if len(kept):
+            parts.append(kept)
+    last = sampler.finish()
+    if len(last):
+        parts.append(last)
+    n_cols = len(header['names'])
+    data = np.concatenate(parts) if parts else np.empty((0, n_cols))
+    if method != 'lttb':
+        data = lttb(data, n_points, time_col=kwargs.get('time_col', 0),
+                    value_col=kwargs.get('event_col', value_col))
+    return header['names'], data, header
+
+
+def get_data(file: Union[Path, str], method: str = 'lttb', n_points: int = 2000, **kwargs):
+    """
+    与CHI_data合并流程对接的接口
+
+    返回:
+    tuple: (时间, 第二列数据, 数据名)
+    """
+    names, data, _ = sample_file(file, method, n_points, **kwargs)
+    return data[:, 0], data[:, 1], names[1]
+
+
+def get_chrono_signals(file: Union[Path, str], method: str = 'event', n_points: int = 2000,
+                       i_signal: Optional[float] = None, **kwargs):
+    """
+    读取并降采样CP/CA文件，返回hybdrt混合(EIS+计时)拟合所需的输入
+
+    参数:
+    i_signal: CP文件中没有电流列时使用的恒定电流值(A)，默认取文件头中的Anodic/Cathodic Current
+
+    返回:
+    tuple: (times, i_signal, v_signal, 开始时间)
+    """
+    names, data, header = sample_file(file, method, n_points, **kwargs)
+    lower = [n.lower() for n in names]
+    times = data[:, 0]
+    i_col = next((i for i, n in enumerate(lower) if n.startswith('current')), None)
+    v_col = next((i for i, n in enumerate(lower) if n.startswith('potential')), None)
+    if v_col is None:
+        raise ValueError(f"文件 {Path(file).name} 中没有电位列")
+
+    if i_col is not None:
+        i_values = data[:, i_col]
+    else:
+        if i_signal is None:
+            params = header['params']
+            i_signal = params.get('Anodic Current (A)', params.get('Cathodic Current (A)'))
+            if i_signal is None:
+                raise ValueError(f"文件 {Path(file).name} 中没有电流信息，请通过i_signal指定")
+            warnings.warn(f"{Path(file).name} 使用文件头中的恒定电流 {i_signal} A")
+        i_values = np.full(len(times), float(i_signal))
+    return times, i_values, data[:, v_col], header['timestamp']
+
+
+if __name__ == "__main__":
+    import sys
+    for fname in sys.argv[1:]:
+        names, data, _ = sample_file(fname)
+        out_name = os.path.splitext(fname)[0] + '_sampled.txt'
+        pd.DataFrame(data, columns=names).to_csv(out_name, sep='\t', index=False)
+        print(f"{fname}: 保留 {len(data)} 个点 -> {out_name}")
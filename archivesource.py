@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+直接读取zip/tar压缩包中的数据文件，无需先解压
+
+压缩包内的文件以 "压缩包路径::成员名" 表示，可像普通文件路径一样传给
+EisDataReader、SpectrumCache、FolderScanner和TimestampIndex；压缩包本身可当作文件夹选择。
+列出成员只读取zip的中央目录(tar需读一遍头部)，不解压文件内容。
+批量读取时zip成员在多个线程中各自解压(zlib解压时释放GIL)，
+压缩的tar只能顺序解压，按顺序流式读取一遍，解析交给线程池。
+"""
+
+import os
+import tarfile
+import zipfile
+import threading
+import posixpath
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Optional
+from pathlib import Path
+
+ARCHIVE_SEP = '::'
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive(path: Union[Path, str]) -> bool:
+    """是否为支持的压缩包文件(不含成员名)"""
+    path = str(path)
+    return (ARCHIVE_SEP not in path and path.lower().endswith(ARCHIVE_SUFFIXES)
+            and os.path.isfile(path))
+
+
+def is_member_path(path: Union[Path, str]) -> bool:
+    return ARCHIVE_SEP in str(path)
+
+
+def split_member(path: Union[Path, str]) -> tuple:
+    """拆分为(压缩包路径, 成员名)，普通文件路径的成员名为空字符串"""
+    archive, _, member = str(path).partition(ARCHIVE_SEP)
+    return archive, member
+
+
+def member_path(archive: Union[Path, str], member: str) -> str:
+    return f'{os.path.abspath(archive)}{ARCHIVE_SEP}{member}'
+
+
+def normalize_path(path: Union[Path, str]) -> str:
+    """
+    文件或成员的规范路径(字符串)，用作缓存键
+
+    只对压缩包部分取绝对路径；成员名保持原样，不能经过Path或os.path，
+    否则在Windows上"camp.zip::sub/eis.txt"会被改写成反斜杠
+    """
+    if is_member_path(path):
+        return member_path(*split_member(path))
+    return os.path.abspath(path)
+
+
+def source_name(path: Union[Path, str]) -> str:
+    """文件名(不含目录)，成员取成员名的最后一段"""
+    if is_member_path(path):
+        return posixpath.basename(split_member(path)[1])
+    return os.path.basename(str(path))
+
+
+def join_source(folder: Union[Path, str], name: str) -> str:
+    """文件夹或压缩包中文件的路径"""
+    if is_archive(folder):
+        return member_path(folder, name)
+    return os.path.join(folder, name)
+
+
+def output_folder(folder: Union[Path, str]) -> str:
+    """结果文件的输出文件夹，压缩包的结果写在压缩包旁边"""
+    if is_archive(folder):
+        return os.path.dirname(os.path.abspath(folder))
+    return str(folder)
+
+
+def _is_zip(archive: str) -> bool:
+    return archive.lower().endswith('.zip')
+
+
+def _zip_mtime(info: zipfile.ZipInfo) -> float:
+    """zip成员头中的修改时间(本地时间，无时区)"""
+    return datetime(*info.date_time).timestamp()
+
+
+def list_members(archive: Union[Path, str], is_candidate=None) -> list:
+    """
+    列出压缩包中的文件，不解压内容
+
+    参数:
+    is_candidate: 按文件名(不含目录)过滤的函数，如FolderScanner.is_candidate
+
+    返回:
+    list: [(成员路径, 大小, 修改时间ns), ...]，按成员名排序
+    """
+    archive = os.path.abspath(archive)
+    entries = []
+    if _is_zip(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                entries.append((info.filename, info.file_size, int(_zip_mtime(info) * 1e9)))
+    else:
+        with tarfile.open(archive, 'r:*') as tf:
+            for info in tf:
+                if info.isfile():
+                    entries.append((info.name, info.size, int(info.mtime * 1e9)))
+    if is_candidate is not None:
+        entries = [e for e in entries if is_candidate(os.path.basename(e[0]))]
+    entries.sort(key=lambda x: x[0])
+    return [(member_path(archive, name), size, mtime) for name, size, mtime in entries]
+
+
+def read_member(path: Union[Path, str]) -> bytes:
+    """读取单个成员的原始字节；批量读取请用iter_members，避免反复打开压缩包"""
+    archive, member = split_member(path)
+    if _is_zip(archive):
+        with zipfile.ZipFile(archive) as zf:
+            return zf.read(member)
+    with tarfile.open(archive, 'r:*') as tf:
+        f = tf.extractfile(member)
+        if f is None:
+            raise ValueError(f"{member} 不是压缩包 {Path(archive).name} 中的文件")
+        return f.read()
+
+
+def member_mtime(path: Union[Path, str]) -> float:
+    """成员头中记录的修改时间(秒)；批量读取时iter_members已一并给出"""
+    archive, member = split_member(path)
+    if _is_zip(archive):
+        with zipfile.ZipFile(archive) as zf:
+            return _zip_mtime(zf.getinfo(member))
+    with tarfile.open(archive, 'r:*') as tf:
+        return float(tf.getmember(member).mtime)
+
+
+def iter_members(archive: Union[Path, str], members: Optional[list] = None):
+    """
+    按压缩包中的顺序流式产出 (成员路径, 原始字节, 成员修改时间秒)，只打开压缩包一次
+
+    参数:
+    members: 需要的成员名，None表示全部文件
+    """
+    archive = os.path.abspath(archive)
+    wanted = None if members is None else set(members)
+    if _is_zip(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and (wanted is None or info.filename in wanted):
+                    yield member_path(archive, info.filename), zf.read(info), _zip_mtime(info)
+        return
+    # 'r|*' 为流模式，压缩的tar只顺序解压一遍
+    with tarfile.open(archive, 'r|*') as tf:
+        for info in tf:
+            if info.isfile() and (wanted is None or info.name in wanted):
+                yield (member_path(archive, info.name), tf.extractfile(info).read(),
+                       float(info.mtime))
+
+
+def load_members(archive: Union[Path, str], members: list, parse, workers: Optional[int] = None):
+    """
+    批量读取并解析压缩包成员
+
+    zip成员在各线程中独立解压(每个线程打开自己的ZipFile)，
+    tar由当前线程顺序解压，解析在线程池中与解压重叠进行；
+    已解压未解析的成员最多2*workers个，内存占用不随压缩包大小增长
+
+    参数:
+    parse: parse(成员路径, 原始字节, 成员修改时间秒)，在工作线程中调用，需自行保证线程安全
+    workers: 线程数，默认为CPU数(最多8)
+
+    返回:
+    list: [(成员路径, 解析结果或异常), ...]，zip按members的顺序，tar按压缩包中的顺序
+    """
+    archive = os.path.abspath(archive)
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    def safe_parse(path, raw, mtime):
+        try:
+            return path, parse(path, raw, mtime)
+        except Exception as e:
+            return path, e
+
+    if not _is_zip(archive):
+        in_flight = threading.BoundedSemaphore(2 * workers)
+        futures = []
+        with ThreadPoolExecutor(workers) as executor:
+            for path, raw, mtime in iter_members(archive, members):
+                # 解析跟不上解压时在此等待，原始字节随解析完成释放
+                in_flight.acquire()
+                future = executor.submit(safe_parse, path, raw, mtime)
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+        return [f.result() for f in futures]
+
+    local = threading.local()
+
+    def read_zip(member):
+        # ZipFile对象不能在线程间共享读取
+        if getattr(local, 'zf', None) is None:
+            local.zf = zipfile.ZipFile(archive)
+            handles.append(local.zf)
+        path = member_path(archive, member)
+        try:
+            info = local.zf.getinfo(member)
+            raw = local.zf.read(info)
+        except KeyError as e:
+            return path, e
+        return safe_parse(path, raw, _zip_mtime(info))
+
+    handles = []
+    try:
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(read_zip, members))
+    finally:
+        for zf in handles:
+            zf.close()
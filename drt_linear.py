@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+"""
+DRT的线性(岭回归)近似模型及正则化参数自动选择
+
+Z(ω) = R_inf + jωL + Σ γ_k Δlnτ / (1 + jωτ_k)      (DRT)
+Z(ω) = R_0 + jωL + Σ R_k / (1 + jωτ_k)             (Lin-KK检验)
+
+拟合采用模值加权(残差除以|Z|)，惩罚项为ln τ上0~2阶差分的加权和。
+对加权后的标准形式做一次SVD后，任意lambda下的残差、解范数、
+影响矩阵的迹均可由闭式计算，因此可以廉价地扫描大量lambda。
+"""
+
+import numpy as np
+
+# 与GUI输入框一致的lambda取值范围
+LAMBDA_RANGE = (1e-6, 1e3)
+LAMBDA_METHODS = ('gcv', 'lcurve', 'discrepancy')
+# 惩罚项中0、1、2阶差分的权重。只惩罚二阶差分时，小tau处γ的平台不受约束，与R_inf此消彼长
+DERIVATIVE_WEIGHTS = (1.0, 1.0, 1.0)
+# 修正GCV中有效参数个数的放大系数(Kim & Gu, 2004)，GCV曲线平坦时避免选出过小的lambda
+GCV_RHO = 1.4
+# 共用分解时各谱权重与自身模值加权之比的允许范围，超出的谱单独求解
+SHARED_TOL = 1.05
+LINKK_MU = 0.85  # Lin-KK单元数的μ判据阈值(Schönleber等, 2014)
+
+
+def drt_matrix(freq, tau, fit_inductance=True):
+    """DRT的复数设计矩阵，列依次为 R_inf、(L)、各tau上的RC单元"""
+    omega = 2 * np.pi * np.asarray(freq, dtype=float)
+    dlnt = np.gradient(np.log(tau))
+    rc = dlnt[None, :] / (1 + 1j * omega[:, None] * tau[None, :])
+    cols = [np.ones((len(omega), 1), dtype=complex)]
+    if fit_inductance:
+        cols.append(1j * omega[:, None])
+    return np.hstack(cols + [rc])
+
+
+def penalty_matrix(n_special, grid, weights=DERIVATIVE_WEIGHTS):
+    """
+    对分布部分的差分惩罚矩阵，weights[i]为i阶差分的权重；special列(R_inf, L)只加很弱的0阶惩罚
+    """
+    n = len(grid)
+    step = np.mean(np.abs(np.diff(grid))) if n > 1 else 1.0
+    p = np.zeros((n_special + n, n_special + n))
+    diff = np.eye(n)
+    for order, weight in enumerate(weights):
+        if order:
+            diff = np.diff(diff, axis=0)
+        if weight:
+            # 按网格间距归一化，使惩罚近似为 ∫(d^order γ)² dlnτ，与网格点数无关
+            d = diff / step ** order
+            p[n_special:, n_special:] += weight * step * d.T @ d
+    # 加上很小的单位阵使惩罚矩阵满秩，便于化为标准形式
+    p += 1e-8 * np.eye(n_special + n)
+    return p
+
+
+class SpectralTerms:
+    """
+    单个谱的模值加权岭回归在标准形式下的闭式量，由_standard_form或ridge_solve_shared的SVD得到，
+    之后任意lambda下的残差、解范数、影响矩阵的迹都无需重新分解
+
+    参数:
+    s: 奇异值
+    beta: 加权数据在左奇异向量上的投影
+    res_perp: 加权数据中不在设计矩阵列空间内的部分的平方和
+    m: 实数化后的数据点数
+    """
+    def __init__(self, s, beta, res_perp, m):
+        self.s = np.asarray(s, dtype=float)
+        self.beta = np.asarray(beta, dtype=float)
+        self.res_perp = float(res_perp)
+        self.m = m
+
+    def _filter(self, lam):
+        lam = np.atleast_1d(np.asarray(lam, dtype=float))
+        s2 = self.s ** 2
+        return s2[None, :] / (s2[None, :] + lam[:, None])
+
+    def residual_norm(self, lam):
+        """加权残差平方和"""
+        f = self._filter(lam)
+        return ((1 - f) ** 2 * self.beta ** 2).sum(axis=1) + self.res_perp
+
+    def solution_norm(self, lam):
+        """惩罚项 xᵀPx"""
+        f = self._filter(lam)
+        return (f ** 2 * (self.beta / self.s) ** 2).sum(axis=1)
+
+    def dof(self, lam):
+        """影响矩阵的迹(有效参数个数)"""
+        return self._filter(lam).sum(axis=1)
+
+    def gcv(self, lam):
+        """修正GCV，有效参数个数乘以GCV_RHO"""
+        denom = self.m - GCV_RHO * self.dof(lam)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denom > 0, self.m * self.residual_norm(lam) / denom ** 2, np.inf)
+
+
+def lcurve_curvature(residual, solution, lam):
+    """对数坐标下L曲线(残差, 解范数)随lambda的曲率，由有限差分估计"""
+    x, y, t = np.log(residual), np.log(solution), np.log(lam)
+    dx, dy = np.gradient(x, t), np.gradient(y, t)
+    ddx, ddy = np.gradient(dx, t), np.gradient(dy, t)
+    return (dx * ddy - ddx * dy) / (dx ** 2 + dy ** 2) ** 1.5
+
+
+def _discrepancy_lambda(problem, noise, lam_range, n_coarse, n_bisect=30):
+    """
+    偏差原理: 残差随lambda单调增加，取残差不超过噪声水平的最大lambda
+
+    整个范围内残差都不超过噪声水平时返回lambda上限；
+    lambda下限处的残差已超过噪声水平时无法满足，抛出ValueError
+    """
+    target = problem.m * noise ** 2
+    lam = np.logspace(np.log10(lam_range[0]), np.log10(lam_range[1]), n_coarse)
+    ok = problem.residual_norm(lam) <= target
+    if not ok[0]:
+        raise ValueError(f"lambda={lam[0]:g}时的残差仍高于噪声水平{noise:.3g}，无法按偏差原理选择lambda")
+    if ok[-1]:
+        return float(lam[-1])
+    i = np.flatnonzero(ok)[-1]
+    lo, hi = np.log10(lam[i]), np.log10(lam[i + 1])
+    for _ in range(n_bisect):
+        mid = (lo + hi) / 2
+        if problem.residual_norm(10 ** mid)[0] <= target:
+            lo = mid
+        else:
+            hi = mid
+    return float(10 ** lo)
+
+
+def select_lambda(problem, method='gcv', lam_range=LAMBDA_RANGE, noise=None,
+                  n_coarse=19, n_fine=21, n_refine=2):
+    """
+    由粗到细搜索lambda
+
+    参数:
+    problem: SpectralTerms
+    method: 'gcv'、'lcurve' 或 'discrepancy'
+    noise: discrepancy方法所用的相对测量误差(每个实部/虚部分量)，可由estimate_noise估计
+
+    返回:
+    float: 选中的lambda
+    """
+    if method not in LAMBDA_METHODS:
+        raise ValueError(f"未知的lambda选择方法 {method}，可选: {', '.join(LAMBDA_METHODS)}")
+    if method == 'discrepancy':
+        if noise is None:
+            raise ValueError("discrepancy方法需要给定噪声水平noise")
+        return _discrepancy_lambda(problem, noise, lam_range, n_coarse)
+
+    def score(lam):
+        if method == 'gcv':
+            return problem.gcv(lam)
+        return -lcurve_curvature(problem.residual_norm(lam), problem.solution_norm(lam), lam)
+
+    lo, hi = np.log10(lam_range[0]), np.log10(lam_range[1])
+    lam = np.logspace(lo, hi, n_coarse)
+    best = lam[np.nanargmin(score(lam))]
+    for _ in range(n_refine):
+        # 在上一轮最优点两侧各一个网格间距内细化
+        step = np.log10(lam[1] / lam[0])
+        lo_i = max(np.log10(best) - step, lo)
+        hi_i = min(np.log10(best) + step, hi)
+        lam = np.logspace(lo_i, hi_i, n_fine)
+        best = lam[np.nanargmin(score(lam))]
+    return float(best)
+
+
+def select_lambdas(s, beta, res_perp, m, method='gcv', noise=None):
+    """
+    由一次(批量)SVD的结果为每个谱分别选择lambda
+
+    参数:
+    s: 共用分解时为一维奇异值，逐谱分解时为 (k × n)
+    beta, res_perp: 各谱的 (k × n) 投影与 (k,) 列空间外残差
+    noise: discrepancy方法所用的各谱噪声水平，见estimate_noise
+
+    返回:
+    ndarray: 各谱的lambda
+    """
+    beta = np.atleast_2d(beta)
+    s = np.broadcast_to(s, beta.shape)
+    noise = [None] * len(beta) if noise is None else np.broadcast_to(noise, (len(beta),))
+    return np.array([select_lambda(SpectralTerms(s[j], beta[j], res_perp[j], m), method,
+                                   noise=noise[j]) for j in range(len(beta))])
+
+
+def _standard_form(a, z, penalty):
+    """
+    共用设计矩阵的一组谱模值加权后化为标准形式，所有谱在一次批量SVD中完成
+
+    返回:
+    tuple: (s, vt, beta, res_perp, z_scale, r_inv, m)，s、beta、res_perp、m的含义同SpectralTerms
+    """
+    z = np.atleast_2d(z)
+    weight = 1 / np.abs(z)
+    z_scale = np.sqrt(np.mean(np.abs(z) ** 2, axis=1))
+    aw = a[None, :, :] * weight[:, :, None]
+    a_real = np.concatenate([aw.real, aw.imag], axis=1)
+    b = np.concatenate([(z * weight).real, (z * weight).imag], axis=1)
+
+    # 各谱的惩罚为 P / z_scale²，对应的Cholesky因子为 R / z_scale
+    r_inv = np.linalg.inv(np.linalg.cholesky(penalty).T)
+    a_bar = (a_real @ r_inv) * z_scale[:, None, None]
+    u, s, vt = np.linalg.svd(a_bar, full_matrices=False)
+    beta = np.einsum('kmj,km->kj', u, b)
+    res_perp = np.maximum((b * b).sum(axis=1) - (beta * beta).sum(axis=1), 0)
+    return s, vt, beta, res_perp, z_scale, r_inv, b.shape[1]
+
+
+def posterior(a, z, penalty, lam=None):
+    """
+    一组共用频率网格的谱在岭回归近似下的参数后验均值与标准差，所有谱在一次批量SVD中计算
+
+    后验均值即岭回归的解；后验协方差取 σ²(AᵀWA + λP)⁻¹ 的对角元，σ²由各谱自身的残差估计，
+    标准形式下为 V diag(1/(s²+λ)) Vᵀ 的低秩部分加上数据无法约束方向的先验部分。
+
+    参数:
+    a: 共用的复数设计矩阵 (m × n)
+    z: 复数阻抗 (k × m)
+    penalty: 惩罚矩阵 (n × n)
+    lam: 每个谱的lambda，标量或长度为k的数组；为None时由同一次SVD按各谱的GCV选择
+
+    返回:
+    tuple: ((k × n) 的后验均值, (k × n) 的后验标准差, 各谱所用的lambda)
+    """
+    s, vt, beta, res_perp, z_scale, r_inv, m = _standard_form(a, z, penalty)
+    k = len(s)
+    if lam is None:
+        lam = select_lambdas(s, beta, res_perp, m, 'gcv')
+    lam = np.broadcast_to(np.asarray(lam, dtype=float), (k,))
+    s2 = s ** 2
+    f = s2 / (s2 + lam[:, None])
+    res = ((1 - f) ** 2 * beta ** 2).sum(axis=1) + res_perp
+    sigma2 = res / np.maximum(m - f.sum(axis=1), 1)
+    x_bar = np.einsum('kj,kji->ki', f / s * beta, vt)
+    mean = (x_bar @ r_inv.T) * z_scale[:, None]
+
+    g2 = (r_inv[None, :, :] @ np.transpose(vt, (0, 2, 1)) * z_scale[:, None, None]) ** 2
+    p_inv_diag = (r_inv ** 2).sum(axis=1)[None, :] * z_scale[:, None] ** 2
+    diag = (g2 / (s2 + lam[:, None])[:, None, :]).sum(axis=2) \
+        + (p_inv_diag - g2.sum(axis=2)) / lam[:, None]
+    return mean, np.sqrt(sigma2[:, None] * np.maximum(diag, 0)), np.array(lam)
+
+
+def _group_by_grid(freqs):
+    """按频率网格分组，返回各组在输入中的序号列表"""
+    groups = {}
+    for i, freq in enumerate(freqs):
+        freq = np.asarray(freq, dtype=float)
+        key = (len(freq), freq.tobytes())
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
+
+
+def distribution_posterior(freqs, zs, lams, tau):
+    """
+    按频率网格分组，批量计算各谱DRT分布(tau网格上)的后验均值与标准差，见posterior
+
+    参数:
+    lams: 各谱的lambda，为None时各谱按GCV选择
+
+    返回:
+    tuple: (均值列表, 标准差列表, lambda列表)，与输入顺序一致，已去掉R_inf和电感
+    """
+    penalty = penalty_matrix(2, np.log(tau))
+    n = len(freqs)
+    out_mean, out_std, out_lam = [None] * n, [None] * n, [None] * n
+    for idx in _group_by_grid(freqs):
+        a = drt_matrix(np.asarray(freqs[idx[0]], dtype=float), tau)
+        lam = None if lams is None else np.array([lams[i] for i in idx], dtype=float)
+        mean, std, lam = posterior(a, np.array([zs[i] for i in idx]), penalty, lam)
+        for j, i in enumerate(idx):
+            out_mean[i], out_std[i], out_lam[i] = mean[j, 2:], std[j, 2:], float(lam[j])
+    return out_mean, out_std, out_lam
+
+
+def linkk_matrix(freq, n_tau):
+    """Lin-KK的复数设计矩阵，列依次为 R_0、L、n_tau个RC单元，τ_k在1/ω_max到1/ω_min间对数等距"""
+    omega = 2 * np.pi * np.asarray(freq, dtype=float)
+    tau = np.logspace(np.log10(1 / omega.max()), np.log10(1 / omega.min()), n_tau)
+    rc = 1 / (1 + 1j * omega[:, None] * tau[None, :])
+    return np.hstack([np.ones((len(omega), 1)), 1j * omega[:, None], rc])
+
+
+def linkk_residuals(freq, z, per_decade=7, mu_c=LINKK_MU):
+    """
+    共用频率网格的一组谱的Lin-KK拟合，每个单元数下所有谱的正规方程在一次批量求解中完成
+
+    RC单元数按Schönleber等(2014)的μ = 1 - Σ|R_k<0| / Σ|R_k≥0| 限制: 单元过多时出现成对的
+    正负电阻，拟合开始吸收漂移等不满足KK关系的成分。逐谱在μ不低于mu_c的单元数中取残差最小者；
+    单元数很少、网格太稀时μ也会偶然降低，因此不在μ第一次低于mu_c处截止
+
+    参数:
+    z: 复数阻抗 (k × m)
+    per_decade: 每数量级单元数的上限
+    mu_c: μ判据的阈值
+
+    返回:
+    tuple: ((k × m) 的复数相对残差 (Z - Z_fit) / |Z|, 各谱所用的RC单元数)
+    """
+    freq = np.asarray(freq, dtype=float)
+    z = np.atleast_2d(z)
+    weight = 1 / np.abs(z)
+    b = np.concatenate([(z * weight).real, (z * weight).imag], axis=1)
+    n_max = max(int(round(np.log10(freq.max() / freq.min()) * per_decade)), 1) + 1
+    best = np.full(len(z), np.inf)
+    res = np.empty_like(z)
+    n_used = np.zeros(len(z), dtype=int)
+    for n_tau in range(1, n_max + 1):
+        a = linkk_matrix(freq, n_tau)
+        aw = a[None, :, :] * weight[:, :, None]
+        a_real = np.concatenate([aw.real, aw.imag], axis=1)
+        # 列按范数归一化后解正规方程，比逐谱QR分解快数倍
+        norm = np.sqrt((a_real ** 2).sum(axis=1))[:, None, :]
+        a_real = a_real / norm
+        gram = np.matmul(np.transpose(a_real, (0, 2, 1)), a_real)
+        rhs = np.matmul(np.transpose(a_real, (0, 2, 1)), b[:, :, None])
+        x = np.linalg.solve(gram, rhs)[:, :, 0] / norm[:, 0, :]
+        rk = x[:, 2:]
+        neg = np.where(rk < 0, -rk, 0).sum(axis=1)
+        pos = np.where(rk >= 0, rk, 0).sum(axis=1)
+        mu = 1 - neg / np.maximum(pos, np.finfo(float).tiny)
+        res_n = (z - x @ a.T) * weight
+        score = np.mean(res_n.real ** 2 + res_n.imag ** 2, axis=1)
+        # 单个RC时μ恒为1，因此每个谱至少有一个可用的单元数
+        better = (mu >= mu_c) & (score < best)
+        best[better] = score[better]
+        res[better] = res_n[better]
+        n_used[better] = n_tau
+    return res, n_used
+
+
+def linkk_scores(freqs, zs, per_decade=7):
+    """
+    批量Kramers-Kronig检验，按频率网格分组
+
+    返回:
+    ndarray: 各谱相对残差(实部与虚部)的均方根
+    """
+    scores = np.full(len(freqs), np.nan)
+    for idx in _group_by_grid(freqs):
+        res, _ = linkk_residuals(np.asarray(freqs[idx[0]], dtype=float),
+                                 np.array([zs[i] for i in idx]), per_decade)
+        scores[idx] = np.sqrt(np.mean(res.real ** 2 + res.imag ** 2, axis=1) / 2)
+    return scores
+
+
+def estimate_noise(freq, z, per_decade=7):
+    """
+    由Lin-KK拟合的残差估计相对测量误差，z为 (k × m) 时共用频率网格的各谱一次完成
+
+    返回:
+    float或ndarray: 相对残差每个实部/虚部分量的标准差，已扣除拟合参数占用的自由度
+    """
+    res, n_tau = linkk_residuals(freq, z, per_decade)
+    dof = np.maximum(2 * res.shape[1] - (n_tau + 2), 1)
+    noise = np.sqrt(np.sum(res.real ** 2 + res.imag ** 2, axis=1) / dof)
+    return noise if np.ndim(z) == 2 else float(noise[0])
+
+
+def ridge_solve(a, z, penalty, lam):
+    """
+    共用设计矩阵的一组谱的模值加权岭回归，各谱的正规方程在一次批量求解中完成
+
+    参数与posterior相同
+
+    返回:
+    ndarray: (k × n) 的参数向量
+    """
+    z = np.atleast_2d(z)
+    k = len(z)
+    lam = np.broadcast_to(np.asarray(lam, dtype=float), (k,))
+    weight = 1 / np.abs(z)
+    z_scale2 = np.mean(np.abs(z) ** 2, axis=1)
+    aw = a[None, :, :] * weight[:, :, None]
+    a_real = np.concatenate([aw.real, aw.imag], axis=1)
+    b = np.concatenate([(z * weight).real, (z * weight).imag], axis=1)
+    # 与_standard_form相同的尺度: 惩罚为 λ P / z_scale²
+    lhs = np.einsum('kmi,kmj->kij', a_real, a_real) \
+        + (lam / z_scale2)[:, None, None] * penalty[None, :, :]
+    rhs = np.einsum('kmi,km->ki', a_real, b)
+    return np.linalg.solve(lhs, rhs[:, :, None])[:, :, 0]
+
+
+def _solve_own(a, z, penalty, lam=None, method='gcv', noise=None):
+    """各谱按自身模值加权求解，lam为None时由一次批量SVD逐谱选择，返回(参数向量, lambda)"""
+    if lam is None:
+        s, _, beta, res_perp, _, _, m = _standard_form(a, z, penalty)
+        lam = select_lambdas(s, beta, res_perp, m, method, noise)
+    return ridge_solve(a, z, penalty, lam), np.broadcast_to(np.asarray(lam, dtype=float), (len(z),))
+
+
+def ridge_solve_shared(a, z, penalty, lam=None, method='gcv', noise=None, tol=SHARED_TOL):
+    """
+    共用频率网格的一组谱共用一次SVD，每个谱只是不同的右端项
+
+    逐谱的模值加权会使每个谱的系统矩阵不同。由于该问题对阻抗的整体缩放不变，
+    先把各谱除以自身的均方根模值，再统一以组内归一化模值的均方根加权；
+    归一化模值在任一频率上与参考相差超过tol倍的谱不参与共用，按自身权重求解。
+    共用的只有分解，lambda仍按各谱自身的数据选择: 标准形式下各谱只有β不同
+
+    参数:
+    lam: 各谱的lambda(标量或数组)，为None时各谱按method分别选择
+    method, noise: 同select_lambdas
+    tol: 共用求解允许的归一化模值与参考之比
+
+    返回:
+    tuple: ((k × n) 的参数向量, 各谱所用的lambda, 共用求解的谱的布尔掩码)
+    """
+    z = np.atleast_2d(z)
+    k = len(z)
+    if lam is not None:
+        lam = np.broadcast_to(np.asarray(lam, dtype=float), (k,))
+    if noise is not None:
+        noise = np.broadcast_to(np.asarray(noise, dtype=float), (k,))
+    scale = np.sqrt(np.mean(np.abs(z) ** 2, axis=1))
+    mod = np.abs(z) / scale[:, None]
+    shared = np.ones(k, dtype=bool)
+    for _ in range(2):
+        # 参考模值先由全组得到，剔除形状差异大的谱后再算一次
+        ref = np.sqrt(np.mean(mod[shared] ** 2, axis=0))
+        shared = np.max(np.abs(np.log(mod / ref)), axis=1) <= np.log(tol)
+        if not shared.any():
+            break
+
+    x = np.empty((k, a.shape[1]))
+    lams = np.empty(k)
+    if shared.any():
+        # 归一化后的谱均方根模值为1，惩罚不再需要按z_scale缩放
+        weight = 1 / ref
+        aw = a * weight[:, None]
+        zw = z[shared] / scale[shared, None] * weight
+        a_real = np.vstack([aw.real, aw.imag])
+        b = np.hstack([zw.real, zw.imag])
+        r = np.linalg.cholesky(penalty).T
+        u, sv, vt = np.linalg.svd(np.linalg.solve(r.T, a_real.T).T, full_matrices=False)
+        beta = b @ u
+        res_perp = np.maximum((b * b).sum(axis=1) - (beta * beta).sum(axis=1), 0)
+        if lam is None:
+            lam_s = select_lambdas(sv, beta, res_perp, a_real.shape[0], method,
+                                   None if noise is None else noise[shared])
+        else:
+            lam_s = lam[shared]
+        s2 = sv ** 2
+        f = s2[None, :] / (s2[None, :] + lam_s[:, None])
+        x_bar = (f / sv * beta) @ vt
+        x[shared] = np.linalg.solve(r, x_bar.T).T * scale[shared, None]
+        lams[shared] = lam_s
+    if not shared.all():
+        x[~shared], lams[~shared] = _solve_own(
+            a, z[~shared], penalty, None if lam is None else lam[~shared], method,
+            None if noise is None else noise[~shared])
+    return x, lams, shared
+
+
+class LinearDRTFit:
+    """
+    岭回归近似的DRT拟合结果，提供与hybdrt DRT相同的predict_distribution、predict_z接口，
+    可直接用于绘图和输出表格
+
+    参数:
+    tau: 拟合所用的tau网格
+    x: 参数向量，依次为 R_inf、L、各tau上的γ
+    lam: 所用的lambda
+    """
+    def __init__(self, tau, x, lam):
+        self.tau = np.asarray(tau, dtype=float)
+        self.x = np.asarray(x)
+        self.lam = lam
+
+    @property
+    def r_inf(self):
+        return self.x[0]
+
+    @property
+    def inductance(self):
+        return self.x[1]
+
+    def predict_distribution(self, tau=None):
+        """在给定tau上的DRT分布，网格不同时按lnτ线性插值"""
+        gamma = self.x[2:]
+        if tau is None:
+            return gamma.copy()
+        return np.interp(np.log(tau), np.log(self.tau), gamma)
+
+    def predict_z(self, frequencies):
+        return drt_matrix(frequencies, self.tau) @ self.x
+
+
+def fit_ridge_batch(freqs, zs, lams, tau, shared=False, method='gcv'):
+    """
+    批量岭回归DRT拟合，按频率网格分组，每组一次批量求解
+
+    参数:
+    lams: 各谱的lambda(岭回归自身的尺度)，为None时各谱按method分别选择
+    shared: 为True时每组用ridge_solve_shared共用一次分解
+    method: 自动选择lambda的准则，见select_lambda
+
+    返回:
+    list: 与输入顺序一致的LinearDRTFit
+    """
+    penalty = penalty_matrix(2, np.log(tau))
+    out = [None] * len(freqs)
+    for idx in _group_by_grid(freqs):
+        freq = np.asarray(freqs[idx[0]], dtype=float)
+        a = drt_matrix(freq, tau)
+        z = np.array([zs[i] for i in idx])
+        lam = None if lams is None else np.array([lams[i] for i in idx], dtype=float)
+        noise = estimate_noise(freq, z) if lam is None and method == 'discrepancy' else None
+        if shared:
+            x, lam, _ = ridge_solve_shared(a, z, penalty, lam, method, noise)
+        else:
+            x, lam = _solve_own(a, z, penalty, lam, method, noise)
+        for j, i in enumerate(idx):
+            out[i] = LinearDRTFit(tau, x[j], float(lam[j]))
+    return out
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+DRT结果的批量峰识别与等效电路(RQ/ZARC)参数估计
+
+所有谱共用同一tau网格，因此整批结果是一个(谱 × tau)矩阵，
+峰位置、峰高、峰面积均在该矩阵上一次性向量化计算。
+
+ZARC单元的DRT为 γ(x) = R/(2π) · sin(φπ) / (cosh(φx) + cos(φπ))，x = ln(τ/τ0)，
+峰高 h = R/(2π) · tan(φπ/2)，由峰面积R和峰高即可得到 φ = (2/π)·arctan(2πh/R)，
+Q = τ0^φ / R。
+"""
+
+import os
+import numpy as np
+
+
+def find_peaks(gamma, tau, min_height=0.05):
+    """
+    批量识别DRT峰
+
+    每个峰的积分区间为其两侧最近的局部极小值(或网格端点)之间
+
+    参数:
+    gamma: (谱 × tau) 的DRT矩阵
+    tau: 共用的tau网格
+    min_height: 峰高下限，相对于该谱的最大峰高
+
+    返回:
+    dict: 各峰的 'spectrum'(行号)、'tau'、'height'、'area'，按谱、tau排序
+    """
+    gamma = np.atleast_2d(np.asarray(gamma, dtype=float))
+    k, n = gamma.shape
+    ln_tau = np.log(tau)
+    cols = np.arange(n)
+
+    is_max = np.zeros((k, n), dtype=bool)
+    is_max[:, 1:-1] = (gamma[:, 1:-1] > gamma[:, :-2]) & (gamma[:, 1:-1] >= gamma[:, 2:])
+    is_min = np.zeros((k, n), dtype=bool)
+    is_min[:, 1:-1] = (gamma[:, 1:-1] < gamma[:, :-2]) & (gamma[:, 1:-1] <= gamma[:, 2:])
+    is_max &= gamma > min_height * np.nanmax(gamma, axis=1, keepdims=True)
+    is_max &= gamma > 0
+
+    # 每个位置左侧(含)最近的极小值和右侧(含)最近的极小值
+    left = np.maximum.accumulate(np.where(is_min, cols, 0), axis=1)
+    right = np.minimum.accumulate(np.where(is_min, cols, n - 1)[:, ::-1], axis=1)[:, ::-1]
+
+    # 沿lnτ的累积梯形积分
+    cum = np.zeros((k, n))
+    cum[:, 1:] = np.cumsum(0.5 * (gamma[:, 1:] + gamma[:, :-1]) * np.diff(ln_tau), axis=1)
+
+    rows, idx = np.nonzero(is_max)
+    area = cum[rows, right[rows, idx]] - cum[rows, left[rows, idx]]
+
+    # 三点抛物线插值细化峰位置和峰高
+    g0, g1, g2 = gamma[rows, idx - 1], gamma[rows, idx], gamma[rows, idx + 1]
+    denom = g0 - 2 * g1 + g2
+    offset = np.where(denom < 0, 0.5 * (g0 - g2) / np.where(denom < 0, denom, -1), 0.0)
+    step = 0.5 * (ln_tau[idx + 1] - ln_tau[idx - 1])
+    peak_tau = np.exp(ln_tau[idx] + offset * step)
+    height = g1 - 0.25 * (g0 - g2) * offset
+
+    return {'spectrum': rows, 'tau': peak_tau, 'height': height, 'area': area}
+
+
+def zarc_parameters(tau0, height, area):
+    """
+    由峰位置、峰高和峰面积估计ZARC(RQ)参数
+
+    返回:
+    tuple: (R, φ, Q)，面积不为正的峰对应NaN
+    """
+    area = np.asarray(area, dtype=float)
+    r = np.where(area > 0, area, np.nan)
+    phi = np.clip(2 / np.pi * np.arctan(2 * np.pi * np.asarray(height) / r), 1e-3, 1.0)
+    q = np.asarray(tau0) ** phi / r
+    return r, phi, q
+
+
+def assign_tracks(peak_tau, max_gap=0.5):
+    """
+    按峰位置将所有谱的峰归入同一过程: 把全部峰的log10(τ)排序，
+    相邻间隔超过max_gap(数量级)处分开，编号按τ从小到大
+    """
+    log_tau = np.log10(peak_tau)
+    order = np.argsort(log_tau)
+    breaks = np.concatenate([[0], np.diff(log_tau[order]) > max_gap]).astype(int)
+    tracks = np.empty(len(order), dtype=int)
+    tracks[order] = np.cumsum(breaks)
+    return tracks
+
+
+def peak_table(gamma, tau, names, timestamps=None, min_height=0.05, zarc=True,
+               max_gap=0.5):
+    """
+    生成峰跟踪表，每个峰一行
+
+    参数:
+    gamma: (谱 × tau) 的DRT矩阵，行与names对应
+    timestamps: 各谱的测量时间，可为None
+    zarc: 为True时附带RQ/ZARC参数估计
+
+    返回:
+    dict: 列名 -> 数组，可直接转换为DataFrame
+    """
+    peaks = find_peaks(gamma, tau, min_height)
+    rows = peaks['spectrum']
+    table = {'file': np.asarray(names, dtype=object)[rows]}
+    if timestamps is not None:
+        table['timestamp'] = np.asarray(timestamps, dtype=object)[rows]
+    table['track'] = assign_tracks(peaks['tau'], max_gap) if len(rows) else rows
+    table['tau'] = peaks['tau']
+    table['height'] = peaks['height']
+    table['area'] = peaks['area']
+    if zarc:
+        table['R'], table['phi'], table['Q'] = zarc_parameters(
+            peaks['tau'], peaks['height'], peaks['area'])
+    return table
+
+
+def save_peak_table(table, subfolder, plt_name):
+    """保存为 {plt_name}_peaks.txt"""
+    import pandas as pd
+    pd.DataFrame(table).to_csv(os.path.join(subfolder, f'{plt_name}_peaks.txt'),
+                               sep='\t', index=False)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+DRT/DOP拟合流程中与界面无关的部分，供GUI、批处理等入口共用
+"""
+
+import os
+import numpy as np
+import drt_linear
+
+# 所有谱共用的固定tau网格，保证输出表格各列可以直接对齐
+FIXED_BASIS_TAU = np.logspace(-7, 2, 181)
+CI_Z = 1.96  # 95%置信区间对应的标准差倍数
+# 岭回归后验标准差的放大系数: 合成谱(1~2个ZARC，噪声0.3%~5%)上，未放大时区间对真实分布的
+# 平均覆盖率约92%(偏差集中在峰附近，后验方差未计入)，放大1.5倍后约95%
+CI_CALIBRATION = 1.5
+# 预览拟合所用的粗tau网格(每数量级约4.5个点)
+PREVIEW_BASIS_TAU = np.logspace(-7, 2, 41)
+
+
+# 自动选择hybdrt lambda的准则。hybdrt给不出影响矩阵的迹，无法计算GCV，'cv'为奇偶频率点的2折交叉验证
+FIT_LAMBDA_METHODS = ('cv', 'lcurve', 'discrepancy')
+# 岭回归上对应的准则: GCV是留一交叉验证的闭式近似
+RIDGE_METHODS = {'cv': 'gcv', 'lcurve': 'lcurve', 'discrepancy': 'discrepancy'}
+# hybdrt的iw_l2_lambda_0与drt_linear岭回归的lambda定义不同(数据缩放、迭代重加权)，数值不能互换，
+# 因此直接在hybdrt自身的拟合上比较: 先在每数量级一个点的粗网格上比较，再在最优点附近细化
+FIT_LAMBDA_GRID = np.logspace(-1, 3, 5)
+FIT_LAMBDA_REFINE = 2  # 细化时额外拟合的次数(每折)
+DOP_LAMBDA_START = 10.0  # 两个lambda都自动选择时，选择iw lambda期间DOP所用的lambda
+
+
+def _weighted_residual(eis_drt, freq, z):
+    """模值加权残差平方和，与drt_linear的加权一致"""
+    r = (z - eis_drt.predict_z(freq)) / np.abs(z)
+    return float(np.sum(r.real ** 2 + r.imag ** 2))
+
+
+def _parabola_vertex(x, y):
+    """过三点的抛物线的顶点横坐标，三点共线或开口向下时返回None"""
+    (x0, x1, x2), (y0, y1, y2) = x, y
+    denom = (x1 - x0) * (y1 - y2) - (x1 - x2) * (y1 - y0)
+    if denom >= 0:
+        return None
+    return x1 - 0.5 * ((x1 - x0) ** 2 * (y1 - y2) - (x1 - x2) ** 2 * (y1 - y0)) / denom
+
+
+def select_fit_lambda(eis_tup, method, fit, roughness, grid=FIT_LAMBDA_GRID,
+                      n_refine=FIT_LAMBDA_REFINE):
+    """
+    在hybdrt自身的拟合上按准则选择lambda
+
+    'cv': 奇偶频率点分两折，各用一半拟合、另一半检验，取检验残差之和最小者
+    'lcurve': 加权残差与roughness构成的L曲线上曲率最大的点
+    'discrepancy': 残差不超过噪声水平的最大lambda，噪声由Lin-KK残差估计
+
+    先在粗网格grid上比较，再细化n_refine次: cv与lcurve取最优点及两侧相邻点的抛物线顶点(对数坐标)，
+    discrepancy在满足与不满足的相邻两点间二分。同一组频率点的拟合复用同一个hybdrt实例，
+    频率不变时hybdrt不重新计算基函数矩阵
+
+    参数:
+    fit: fit(eis_tup, lam, eis_drt)，eis_drt为上一次拟合的实例(首次为None)，返回拟合好的hybdrt模型
+    roughness: roughness(eis_drt)，L曲线的解范数，如分布二阶差分的平方和
+
+    返回:
+    float: 选中的lambda
+    """
+    if method not in FIT_LAMBDA_METHODS:
+        raise ValueError(f"未知的lambda选择方法 {method}，可选: {', '.join(FIT_LAMBDA_METHODS)}")
+    freq, z = np.asarray(eis_tup[0], dtype=float), np.asarray(eis_tup[1])
+    lo, hi = np.log10(drt_linear.LAMBDA_RANGE)
+    models = {}  # 折 -> 上一次拟合的实例
+    stats = {}  # log10(lambda) -> 准则所需的量
+
+    def evaluate(t):
+        lam = 10 ** t
+        if method == 'cv':
+            total = 0.0
+            for part in (0, 1):
+                train = np.arange(len(freq)) % 2 == part
+                models[part] = fit((freq[train], z[train]), lam, models.get(part))
+                total += _weighted_residual(models[part], freq[~train], z[~train])
+            stats[t] = total
+        else:
+            models[0] = fit((freq, z), lam, models.get(0))
+            stats[t] = (_weighted_residual(models[0], freq, z), roughness(models[0]))
+
+    def score():
+        """各已拟合lambda的得分(越小越好)，按lambda排序"""
+        t = np.array(sorted(stats))
+        if method == 'cv':
+            return t, np.array([stats[v] for v in t])
+        res, rough = np.array([stats[v] for v in t]).T
+        return t, -drt_linear.lcurve_curvature(res, rough, 10 ** t)
+
+    for t in np.log10(np.asarray(grid, dtype=float)):
+        evaluate(t)
+
+    if method == 'discrepancy':
+        target = 2 * len(z) * drt_linear.estimate_noise(freq, z) ** 2
+        ok = lambda v: stats[v][0] <= target
+        t = np.array(sorted(stats))
+        if not ok(t[0]):
+            raise ValueError(f"lambda={10 ** t[0]:g}时的残差仍高于噪声水平，无法按偏差原理选择lambda")
+        good = [v for v in t if ok(v)]
+        left = good[-1]
+        if left == t[-1]:
+            return float(10 ** left)
+        right = t[np.searchsorted(t, left) + 1]
+        for _ in range(n_refine):
+            mid = (left + right) / 2
+            evaluate(mid)
+            left, right = (mid, right) if ok(mid) else (left, mid)
+        return float(10 ** left)
+
+    for _ in range(n_refine):
+        t, y = score()
+        i = int(np.nanargmin(y))
+        if i == 0 or i == len(t) - 1:
+            # 最优点在端点: 向外延伸一步(不超过LAMBDA_RANGE)
+            step = t[1] - t[0] if i == 0 else t[-1] - t[-2]
+            nxt = np.clip(t[i] + (-step if i == 0 else step), lo, hi)
+        else:
+            nxt = _parabola_vertex(t[i - 1:i + 2], y[i - 1:i + 2])
+            if nxt is None or not np.isfinite(nxt):
+                break
+            nxt = float(np.clip(nxt, t[i - 1], t[i + 1]))
+        if min(abs(nxt - v) for v in t) < 0.05:  # 已足够接近
+            break
+        evaluate(nxt)
+    t, y = score()
+    return float(10 ** t[int(np.nanargmin(y))])
+
+
+def resolve_lambdas(eis_tup, iw_l2_lambda_0, dop_l2_lambda_0=DOP_LAMBDA_START, fit_dop=False,
+                    fixed_basis_tau=FIXED_BASIS_TAU, fit_func=None):
+    """
+    lambda为准则名称(见FIT_LAMBDA_METHODS)时，针对该谱在hybdrt拟合上自动选择，见select_fit_lambda
+
+    两者都为准则名称时分别选择: 先以DOP_LAMBDA_START的DOP lambda选择iw lambda，
+    再固定选出的iw lambda选择DOP lambda
+
+    参数:
+    fit_func: 单谱拟合函数，签名同fit_eis_tuple，默认为fit_eis_tuple
+
+    返回:
+    tuple: (iw_l2_lambda_0, dop_l2_lambda_0)
+    """
+    fit_func = fit_func or fit_eis_tuple
+    auto_iw = isinstance(iw_l2_lambda_0, str)
+    auto_dop = fit_dop and isinstance(dop_l2_lambda_0, str)
+    iw = iw_l2_lambda_0
+    dop = (DOP_LAMBDA_START if auto_dop else dop_l2_lambda_0) if fit_dop else dop_l2_lambda_0
+
+    if auto_iw:
+        def fit_iw(tup, lam, eis_drt):
+            return fit_func(tup, lam, fit_dop, dop, fixed_basis_tau, eis_drt=eis_drt)
+
+        def drt_roughness(eis_drt):
+            return np.sum(np.diff(eis_drt.predict_distribution(fixed_basis_tau), 2) ** 2)
+
+        iw = select_fit_lambda(eis_tup, iw_l2_lambda_0, fit_iw, drt_roughness)
+    if auto_dop:
+        def fit_dop_lam(tup, lam, eis_drt):
+            return fit_func(tup, iw, fit_dop, lam, fixed_basis_tau, eis_drt=eis_drt)
+
+        def dop_roughness(eis_drt):
+            _, values = eis_drt.predict_dop(normalize=False, return_nu=True)
+            return np.sum(np.diff(values, 2) ** 2)
+
+        dop = select_fit_lambda(eis_tup, dop_l2_lambda_0, fit_dop_lam, dop_roughness)
+    return iw, dop
+
+
+def fit_eis_tuple(eis_tup, iw_l2_lambda_0, fit_dop=False, dop_l2_lambda_0=DOP_LAMBDA_START,
+                  fixed_basis_tau=FIXED_BASIS_TAU, eis_drt=None):
+    """
+    对单个EIS谱(频率, 复数阻抗)进行DRT拟合，fit_dop为True时同时拟合DOP
+
+    eis_drt为已有的hybdrt DRT实例时在其上重新拟合，频率不变时复用已计算的基函数矩阵
+    """
+    fit_kwargs = {'iw_l2_lambda_0': iw_l2_lambda_0, 'nonneg': False}
+    if fit_dop:
+        fit_kwargs['dop_l2_lambda_0'] = dop_l2_lambda_0
+    if eis_drt is None:
+        from hybdrt.models import DRT  # 仅在真正拟合时导入，避免拖慢合并等轻量步骤
+
+        eis_drt = DRT(fit_dop=fit_dop, fixed_basis_tau=fixed_basis_tau)
+    eis_drt.dual_fit_eis(*eis_tup, **fit_kwargs)
+    return eis_drt
+
+
+def predict_fit(eis_drt, fit_dop=False, fixed_basis_tau=FIXED_BASIS_TAU):
+    """
+    从拟合结果中取出写入表格所需的数组
+
+    返回:
+    tuple: (DRT分布, DOP横轴nu, 归一化DOP)，未开启DOP时后两项为None
+    """
+    gamma = eis_drt.predict_distribution(fixed_basis_tau)
+    if not fit_dop:
+        return gamma, None, None
+    nu, dop = eis_drt.predict_dop(normalize=True, return_nu=True)
+    return gamma, nu, dop
+
+
+def ridge_fits(eis_tups, iw_l2_lambda_0, tau=FIXED_BASIS_TAU, shared=False):
+    """
+    用岭回归(不含DOP)批量拟合全部谱，共用频率网格的谱一次求解
+
+    岭回归与hybdrt的模型不同(无迭代重加权、数据缩放不同)，lambda的数值和拟合结果
+    都不能与hybdrt的互换，结果应单独标记
+
+    参数:
+    eis_tups: 文件名 -> (频率, 复数阻抗)
+    iw_l2_lambda_0: 岭回归自身尺度上的lambda，或自动选择的准则名称(各谱分别选择，'cv'对应GCV)
+    shared: 为True时共用频率网格的谱共用一次分解，见drt_linear.ridge_solve_shared
+
+    返回:
+    tuple: (fits, lambdas)，均以文件名为键，fits的值为drt_linear.LinearDRTFit
+    """
+    names = list(eis_tups)
+    freqs = [eis_tups[n][0] for n in names]
+    zs = [eis_tups[n][1] for n in names]
+    if isinstance(iw_l2_lambda_0, str):
+        fits = drt_linear.fit_ridge_batch(freqs, zs, None, tau, shared,
+                                          RIDGE_METHODS.get(iw_l2_lambda_0, iw_l2_lambda_0))
+    else:
+        fits = drt_linear.fit_ridge_batch(freqs, zs, [float(iw_l2_lambda_0)] * len(names),
+                                          tau, shared)
+    return dict(zip(names, fits)), {n: fit.lam for n, fit in zip(names, fits)}
+
+
+def preview_fits(eis_tups, preview_tau=PREVIEW_BASIS_TAU):
+    """
+    粗tau网格上的岭回归，作为完整拟合完成前的预览，返回值同ridge_fits
+
+    hybdrt的lambda不能直接用于岭回归，预览的lambda按各谱在岭回归上的GCV选择
+    """
+    return ridge_fits(eis_tups, 'gcv', preview_tau)
+
+
+def compute_ci(eis_tups, fixed_basis_tau=FIXED_BASIS_TAU):
+    """
+    批量计算各谱在岭回归近似模型下的DRT近似95%区间
+
+    区间完全来自近似模型: 以近似模型的后验均值(即岭回归的解，lambda按各谱的GCV选择)为中心，
+    半宽为后验标准差的CI_Z × CI_CALIBRATION倍，共用频率网格的谱在一次批量分解中完成。
+    它描述的是近似模型的不确定度，中心与hybdrt的分布不同，不是hybdrt结果的置信区间。
+    DOP不提供区间
+
+    参数:
+    eis_tups: 文件名 -> (频率, 复数阻抗)
+
+    返回:
+    dict: 文件名 -> {'lo', 'hi', 'lam'}，lam为近似模型所用的lambda
+    """
+    names = list(eis_tups)
+    if not names:
+        return {}
+    freqs = [eis_tups[n][0] for n in names]
+    zs = [eis_tups[n][1] for n in names]
+    means, stds, lams = drt_linear.distribution_posterior(freqs, zs, None, fixed_basis_tau)
+    return {n: {'lo': mean - CI_Z * CI_CALIBRATION * std,
+                'hi': mean + CI_Z * CI_CALIBRATION * std, 'lam': lam}
+            for n, mean, std, lam in zip(names, means, stds, lams)}
+
+
+def add_ci_columns(table, ci):
+    """在每个文件的列后插入区间下限/上限列，列名带_ridge表明区间来自岭回归近似模型"""
+    out = {}
+    for name, values in table.items():
+        out[name] = values
+        if name in ci:
+            out[f'{name}_lo_ridge'] = ci[name]['lo']
+            out[f'{name}_hi_ridge'] = ci[name]['hi']
+    return out
+
+
+def add_ci_summary(summary, ci):
+    """在汇总表中记录计算区间时近似模型所用的lambda(与hybdrt的lambda不可比)"""
+    summary['ci_ridge_lambda'] = [ci.get(n, {}).get('lam', np.nan) for n in summary['file']]
+    return summary
+
+
+def build_fit_tables(records, nu=None, fit_dop=False, ci=None):
+    """
+    将逐谱结果按时间排序后组装为输出表格
+
+    参数:
+    records: [(文件名, 时间戳, DRT分布, DOP或None, (iw, dop) lambda), ...]
+    ci: compute_ci返回的近似模型区间，给定时在DRT表格中插入上下限列
+
+    返回:
+    tuple: (data, data_dop, summary)，records按时间戳原地排序
+    """
+    records.sort(key=lambda x: x[1])
+    data = {'0x': FIXED_BASIS_TAU}
+    data_dop = {'0x_dop': nu} if fit_dop and nu is not None else None
+    summary = {'file': [], 'iw_l2_lambda_0': [], 'dop_l2_lambda_0': []}
+    for name, _, gamma, dop, lambdas in records:
+        data[name] = gamma
+        if data_dop is not None and dop is not None:
+            data_dop[name] = dop
+        summary['file'].append(name)
+        summary['iw_l2_lambda_0'].append(lambdas[0])
+        summary['dop_l2_lambda_0'].append(lambdas[1])
+    if ci:
+        data = add_ci_columns(data, ci)
+        add_ci_summary(summary, ci)
+    return data, data_dop, summary
+
+
+def result_name(first_file, lambda_0):
+    """按第一个(时间最早的)文件名生成结果文件名，压缩包成员只取文件名部分"""
+    return f'DRT_Fit_Results_{os.path.basename(first_file).split(".")[0]}_λ={lambda_0}'
+
+
+def save_fit_tables(data, data_dop, subfolder, plt_name, summary=None):
+    """将DRT(及DOP)数据保存为txt文件，summary为每个谱一行的汇总信息(如选用的lambda)"""
+    import pandas as pd
+    # 保存DRT数据
+    data_df = pd.DataFrame(data)
+    data_df.to_csv(os.path.join(subfolder, f'{plt_name}.txt'),
+                   sep='\t', index=False)
+    if summary:
+        pd.DataFrame(summary).to_csv(os.path.join(subfolder, f'{plt_name}_summary.txt'),
+                                     sep='\t', index=False)
+    if data_dop is None:
+        return
+    data_dop['0x_dop'] = data_dop['0x_dop'] * -90
+    data_dop_df = pd.DataFrame(data_dop)
+    data_dop_df.to_csv(os.path.join(subfolder, f'{plt_name}_dop.txt'),
+                       sep='\t', index=False)
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+常驻本机的DRT分析服务，供采集脚本在每测完一个谱后立即请求拟合
+
+服务进程启动时即导入hybdrt并建立进程池，之后每个请求只需读取文件和拟合，
+无需重新启动Python、导入依赖或创建窗口。每个worker按频率网格保留hybdrt实例，
+同一网格的谱复用已计算的基函数矩阵。仅监听Unix socket或127.0.0.1端口，不访问任何网络。
+
+安全: 服务以启动用户的权限读取请求中的文件并写出结果，请求中的路径必须为绝对路径。
+Unix socket创建为0600，只有启动用户可以连接；127.0.0.1端口则本机任何用户都可以连接，
+多用户的机器上请使用 --socket。
+
+协议: 每行一个JSON请求，服务返回一行JSON响应(NaN以null表示)
+    {"cmd": "fit", "files": [...], "iw_l2_lambda_0": 10 或 "cv", "fit_dop": false,
+     "dop_l2_lambda_0": 10, "output_folder": null, "save": true, "return_arrays": false}
+    {"cmd": "ping"} / {"cmd": "status"} / {"cmd": "shutdown"}
+
+用法:
+    python eis_daemon.py serve [--socket /tmp/eis.sock | --port 8765] [--processes 2]
+    python eis_daemon.py fit 文件或文件夹... [--lambda 10|cv] [--dop 10] [--output 文件夹]
+    python eis_daemon.py status|shutdown
+"""
+
+import os
+import sys
+import json
+import stat
+import time
+import socket
+import argparse
+import threading
+import socketserver
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from drt_pipeline import (FIXED_BASIS_TAU, fit_eis_tuple, build_fit_tables, result_name,
+                          save_fit_tables)
+from filescan import FolderScanner
+from collections import OrderedDict
+from archivesource import is_archive, split_member, normalize_path
+from workqueue_eis import process_job, source_names, _lambda_arg
+
+DEFAULT_PORT = 8765
+MAX_WARM_MODELS = 8  # 每个worker保留的hybdrt实例数(按频率网格)
+
+# ---------------- 进程池中的worker ----------------
+_worker_cache = None  # 每个worker进程常驻的SpectrumCache
+_worker_models = OrderedDict()  # (fit_dop, tau, 频率网格) -> 上次在该网格上拟合的实例
+
+
+def _init_worker():
+    """worker进程启动时预先导入拟合依赖"""
+    global _worker_cache
+    from fileload_all_eis import SpectrumCache
+
+    _worker_cache = SpectrumCache()
+    try:
+        import hybdrt.models  # noqa: F401
+    except ImportError as e:
+        print(f"Error importing hybdrt: {e}")
+
+
+def _warm_up(_):
+    return os.getpid()
+
+
+class _WarmFit:
+    """
+    包装单谱拟合函数: 调用方未给出实例时，取该worker在同一频率网格上用过的实例重新拟合，
+    hybdrt在频率不变时不重新计算基函数矩阵。包括自动选择lambda时各折的拟合
+
+    拟合结果在下一次同网格拟合前即被取用(process_job中逐谱预测)，因此可以复用实例
+    """
+    def __init__(self, fit_func):
+        self.fit_func = fit_func
+
+    def __call__(self, eis_tup, iw_l2_lambda_0, fit_dop=False, dop_l2_lambda_0=10.0,
+                 fixed_basis_tau=FIXED_BASIS_TAU, eis_drt=None):
+        key = None
+        if eis_drt is None:
+            key = (bool(fit_dop), np.asarray(fixed_basis_tau, dtype=float).tobytes(),
+                   np.asarray(eis_tup[0], dtype=float).tobytes())
+            eis_drt = _worker_models.get(key)
+        eis_drt = self.fit_func(eis_tup, iw_l2_lambda_0, fit_dop, dop_l2_lambda_0,
+                                fixed_basis_tau, eis_drt=eis_drt)
+        if key is not None:
+            _worker_models[key] = eis_drt
+            _worker_models.move_to_end(key)
+            while len(_worker_models) > MAX_WARM_MODELS:
+                _worker_models.popitem(last=False)
+        return eis_drt
+
+
+def _fit_one(file_path, name, params, fit_func=fit_eis_tuple):
+    """在worker进程中拟合单个文件，name为其在结果表格中的列名，失败时返回None"""
+    names, timestamps, gammas, nu, dops, lambdas, ci = process_job(
+        {'files': [file_path], 'names': [name]}, params, _worker_cache, _WarmFit(fit_func))
+    if not names:
+        return None
+    name = names[0]
+    return (name, timestamps[0], gammas[0], nu, dops[0] if dops else None, lambdas[0],
+            (ci or {}).get(name))
+
+
+# ---------------- 服务 ----------------
+def _check_absolute(path):
+    if not os.path.isabs(path):
+        raise ValueError(f'路径必须为绝对路径: {path}')
+
+
+class AnalysisDaemon:
+    """
+    常驻的分析服务，持有预热的进程池，处理解析后的请求
+
+    参数:
+    processes: 拟合进程数
+    fit_func: 单谱拟合函数(需可被pickle)，默认为hybdrt的dual_fit_eis流程
+    """
+    def __init__(self, processes=1, fit_func=fit_eis_tuple):
+        self.processes = processes
+        self.fit_func = fit_func
+        self.executor = ProcessPoolExecutor(processes, initializer=_init_worker)
+        # 先让每个进程完成初始化，第一个请求就不必等待导入
+        list(self.executor.map(_warm_up, range(processes)))
+        self.scanner = FolderScanner()
+        self.started = time.time()
+        self.n_requests = 0
+        self.n_files = 0
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def handle(self, request):
+        """处理一个请求，返回可JSON序列化的响应"""
+        cmd = request.pop('cmd', 'fit')
+        if cmd == 'ping':
+            return {'ok': True}
+        if cmd == 'status':
+            return {'ok': True, 'pid': os.getpid(), 'processes': self.processes,
+                    'uptime': time.time() - self.started,
+                    'requests': self.n_requests, 'files': self.n_files}
+        if cmd == 'shutdown':
+            return {'ok': True}
+        if cmd == 'fit':
+            return self.fit(**request)
+        raise ValueError(f'未知的命令 {cmd}')
+
+    def expand(self, items):
+        """
+        文件夹和压缩包展开为其中的EIS文件
+
+        路径必须为绝对路径(压缩包成员指压缩包部分)，否则会相对于服务进程的工作目录解析
+        """
+        paths = []
+        for item in items:
+            _check_absolute(split_member(item)[0])
+            if os.path.isdir(item) or is_archive(item):
+                paths.extend(normalize_path(p) for p in self.scanner.list_files(item))
+            else:
+                paths.append(normalize_path(item))
+        return list(dict.fromkeys(paths))  # 同一文件重复给出时只拟合一次
+
+    def fit(self, files, iw_l2_lambda_0=10.0, fit_dop=False, dop_l2_lambda_0=10.0,
+            output_folder=None, save=True, return_arrays=False):
+        """
+        拟合一组文件，结果按时间排序写入DRT_Fit_Results_*表格
+
+        参数:
+        save: 为True时写出结果表格，响应中给出路径
+        return_arrays: 为True时在响应中附带表格各列(DOP横轴为nu，未换算为角度)
+        """
+        paths = self.expand(files)
+        if output_folder is not None:
+            _check_absolute(output_folder)
+        params = {'iw_l2_lambda_0': iw_l2_lambda_0, 'fit_dop': bool(fit_dop),
+                  'dop_l2_lambda_0': dop_l2_lambda_0}
+        records, ci, failed = [], {}, []
+        nu = None
+        names = source_names(paths)
+        for path, result in zip(paths, self.executor.map(_fit_one, paths, names, repeat(params),
+                                                                repeat(self.fit_func))):
+            if result is None:
+                failed.append(path)
+                continue
+            name, timestamp, gamma, nu_i, dop, lambdas, ci_i = result
+            records.append((name, timestamp, gamma, dop, lambdas))
+            if nu_i is not None:
+                nu = nu_i
+            if ci_i is not None:
+                ci[name] = ci_i
+        self.n_requests += 1
+        self.n_files += len(records)
+        if not records:
+            return {'ok': False, 'error': '没有成功拟合的文件', 'failed': failed}
+
+        data, data_dop, summary = build_fit_tables(records, nu, params['fit_dop'], ci)
+        response = {'ok': True, 'files': summary['file'], 'failed': failed,
+                    'iw_l2_lambda_0': summary['iw_l2_lambda_0'],
+                    'dop_l2_lambda_0': summary['dop_l2_lambda_0']}
+        if return_arrays:
+            response['data'] = {k: np.asarray(v).tolist() for k, v in data.items()}
+            if data_dop is not None:
+                response['data_dop'] = {k: np.asarray(v).tolist() for k, v in data_dop.items()}
+        if save:
+            if output_folder is None:
+                output_folder = os.path.dirname(split_member(paths[0])[0])
+            os.makedirs(output_folder, exist_ok=True)
+            plt_name = result_name(records[0][0], iw_l2_lambda_0)
+            save_fit_tables(data, data_dop, output_folder, plt_name, summary)
+            response['output'] = os.path.join(output_folder, f'{plt_name}.txt')
+        return response
+
+
+def _json_safe(obj):
+    """转换为标准JSON可表示的对象: 数组转为列表，NaN/inf转为null"""
+    if isinstance(obj, dict):
+        return {k: _json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [_json_safe(v) for v in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and not np.isfinite(obj):
+        return None
+    return obj
+
+
+def _dumps(response):
+    """一行严格JSON(allow_nan=False)，无法序列化时返回错误响应"""
+    try:
+        return json.dumps(_json_safe(response), ensure_ascii=False, allow_nan=False)
+    except (TypeError, ValueError) as e:
+        return json.dumps({'ok': False, 'error': f'{type(e).__name__}: {e}'}, ensure_ascii=False)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """逐行读取JSON请求并返回JSON响应，一个连接可以发送多个请求"""
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            cmd = None
+            try:
+                request = json.loads(line)
+                cmd = request.get('cmd', 'fit')
+                response = self.server.analysis.handle(request)
+            except Exception as e:
+                response = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write((_dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+            if cmd == 'shutdown':
+                # shutdown会等待serve_forever返回，需在其他线程中调用
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def serve(socket_path=None, port=DEFAULT_PORT, processes=1, fit_func=fit_eis_tuple):
+    """启动服务并阻塞，直到收到shutdown请求或Ctrl+C"""
+    if socket_path is not None:
+        if not hasattr(socketserver, 'UnixStreamServer'):
+            raise OSError('当前平台不支持Unix socket，请改用 --port')
+        # 清理上次异常退出留下的socket文件
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.remove(socket_path)
+        # 创建时即为0600，只有启动服务的用户可以连接
+        old_umask = os.umask(0o177)
+        try:
+            server = _UnixServer(socket_path, _Handler)
+        finally:
+            os.umask(old_umask)
+        address = socket_path
+    else:
+        server = _TCPServer(('127.0.0.1', port), _Handler)
+        address = f'127.0.0.1:{server.server_address[1]}'
+        print("注意: 本机任何用户都可以连接该端口并让服务读写文件，多用户的机器上请使用 --socket")
+
+    server.analysis = AnalysisDaemon(processes, fit_func)
+    print(f"DRT分析服务已启动: {address} ({processes} 个进程)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.analysis.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+# ---------------- 客户端 ----------------
+def request(payload, socket_path=None, port=DEFAULT_PORT, timeout=None):
+    """向服务发送一个请求并返回响应"""
+    if socket_path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+    else:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    with sock, sock.makefile('rb') as f:
+        sock.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+        line = f.readline()
+    if not line:
+        raise ConnectionError('服务未返回响应')
+    return json.loads(line)
+
+
+def fit_files(files, iw_l2_lambda_0=10.0, fit_dop=False, dop_l2_lambda_0=10.0,
+              output_folder=None, socket_path=None, port=DEFAULT_PORT, **kwargs):
+    """请求服务拟合文件，参数与AnalysisDaemon.fit相同；相对路径在客户端按当前目录转为绝对路径"""
+    payload = dict(cmd='fit', files=[normalize_path(f) for f in files],
+                   iw_l2_lambda_0=iw_l2_lambda_0, fit_dop=fit_dop, dop_l2_lambda_0=dop_l2_lambda_0,
+                   output_folder=None if output_folder is None else os.path.abspath(output_folder),
+                   **kwargs)
+    return request(payload, socket_path, port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='常驻本机的DRT分析服务')
+    parser.add_argument('--socket', default=None, help='Unix socket路径，默认使用127.0.0.1端口')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_serve = sub.add_parser('serve', help='启动服务')
+    p_serve.add_argument('--processes', type=int, default=1)
+
+    p_fit = sub.add_parser('fit', help='请求拟合')
+    p_fit.add_argument('items', nargs='+', help='文件夹或EIS文件')
+    p_fit.add_argument('--lambda', dest='iw_l2_lambda_0', type=_lambda_arg, default=10.0)
+    p_fit.add_argument('--dop', dest='dop_l2_lambda_0', type=_lambda_arg, default=None,
+                       help='给定时开启DOP拟合')
+    p_fit.add_argument('--output', default=None, help='结果输出文件夹')
+
+    sub.add_parser('ping', help='检查服务是否在运行')
+    sub.add_parser('status', help='查看服务状态')
+    sub.add_parser('shutdown', help='停止服务')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        serve(args.socket, args.port, args.processes)
+        return
+    if args.command == 'fit':
+        response = fit_files(args.items, args.iw_l2_lambda_0,
+                             fit_dop=args.dop_l2_lambda_0 is not None,
+                             dop_l2_lambda_0=args.dop_l2_lambda_0 or 10.0,
+                             output_folder=args.output, socket_path=args.socket, port=args.port)
+    else:
+        response = request({'cmd': args.command}, args.socket, args.port)
+    print(json.dumps(response, ensure_ascii=False, indent=1))
+    if not response.get('ok'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
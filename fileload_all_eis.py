@@ -5,22 +5,171 @@ Created on Mon Jul  7 19:39:00 2025
 @author: satellite
 """
 
-import pandas as pd
-from pandas import DataFrame
 from datetime import datetime
+import os
+import mmap
+import codecs
+import locale
 import warnings
+from collections import OrderedDict
 import numpy as np
-from typing import Union, Optional
+from typing import Union, Optional, TYPE_CHECKING
 from pathlib import Path
 import calendar
 import time
+import threading
+from archivesource import (is_member_path, split_member, member_path, normalize_path, source_name,
+                           read_member, member_mtime, load_members)
+
+# pandas仅在需要读取表格时导入，避免单纯导入读取模块就加载pandas
+if TYPE_CHECKING:
+    from pandas import DataFrame
 # import re
 
+# 按前缀识别的BOM，较长的UTF-32 BOM需排在UTF-16之前
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF32_LE, 'utf-32-le'),
+    (codecs.BOM_UTF32_BE, 'utf-32-be'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+# 无BOM且不是合法UTF-8时依次尝试的编码，latin-1可解码任意字节，放在最后
+_FALLBACK_ENCODINGS = ('locale', 'cp1252', 'latin-1')
+# 各数据源中表示测量经过时间(秒)的列名
+_TIME_COLUMNS = ('Time', 'T', 'time', 'time/s', 'elapsed')
+
+
+class EisSpectrum:
+    """
+    单个EIS谱的紧凑记录，拟合只需频率和复数阻抗，模值、相角等派生量在首次访问时才计算
+
+    参数:
+    freq: 频率(Hz)，保存为连续的float64数组
+    z: 复数阻抗，保存为连续的complex128数组
+    source: 数据来源
+    timestamp: 测量开始时间
+    time: 各数据点的经过时间(秒)，文件中没有时为None
+    """
+    __slots__ = ('freq', 'z', 'source', 'timestamp', 'time', '_zmod', '_zphz')
+
+    def __init__(self, freq, z, source: Optional[str] = None,
+                 timestamp: Optional[datetime] = None, time=None):
+        self.freq = np.ascontiguousarray(freq, dtype=np.float64)
+        self.z = np.ascontiguousarray(z, dtype=np.complex128)
+        self.source = source
+        self.timestamp = timestamp
+        self.time = None if time is None else np.ascontiguousarray(time, dtype=np.float64)
+        self._zmod = None
+        self._zphz = None
+
+    def __len__(self) -> int:
+        return len(self.freq)
+
+    def __repr__(self) -> str:
+        return f'EisSpectrum(n={len(self)}, source={self.source!r}, timestamp={self.timestamp})'
+
+    @property
+    def zreal(self) -> np.ndarray:
+        return self.z.real
+
+    @property
+    def zimag(self) -> np.ndarray:
+        return self.z.imag
+
+    @property
+    def zmod(self) -> np.ndarray:
+        if self._zmod is None:
+            self._zmod = np.abs(self.z)
+        return self._zmod
+
+    @property
+    def zphz(self) -> np.ndarray:
+        """相角(度)"""
+        if self._zphz is None:
+            self._zphz = np.angle(self.z, deg=True)
+        return self._zphz
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.freq, self.z, self.time, self._zmod, self._zphz)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def as_tuple(self) -> tuple:
+        """返回hybdrt拟合所需的(频率, 复数阻抗)"""
+        return self.freq, self.z
+
+    def select(self, min_freq: Optional[float] = None,
+               max_freq: Optional[float] = None) -> 'EisSpectrum':
+        """按频率范围截取，返回新的谱"""
+        mask = np.ones(len(self.freq), dtype=bool)
+        if min_freq is not None:
+            mask &= self.freq >= min_freq
+        if max_freq is not None:
+            mask &= self.freq <= max_freq
+        return EisSpectrum(self.freq[mask], self.z[mask], self.source, self.timestamp,
+                           None if self.time is None else self.time[mask])
+
+    def to_dataframe(self) -> 'DataFrame':
+        """转换为与get_eis相同列名的DataFrame，Zmod、Zphz由复数阻抗计算"""
+        import pandas as pd
+
+        data = pd.DataFrame({'Freq': self.freq, 'Zreal': self.zreal, 'Zimag': self.zimag,
+                             'Zmod': self.zmod, 'Zphz': self.zphz})
+        if self.time is not None:
+            data['Time'] = self.time
+            if self.timestamp is not None:
+                data['timestamp'] = self.timestamp + pd.to_timedelta(self.time, unit='s')
+        return data
+
+
+def _line(text: str, start: int = 0) -> str:
+    """text中从start开始的一行，不含行尾的\r\n；只复制这一行"""
+    end = text.find('\n', start)
+    return text[start:len(text) if end < 0 else end].rstrip('\r')
+
+
+class _TextView:
+    """
+    字符串的只读文件式视图，供pd.read_csv按块读取，避免为解析表格再复制整段文本
+
+    文本保留原始换行符，按行读取时把\r\n换为\n，不为统一换行符复制整段文本
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def read(self, size: int = -1) -> str:
+        end = len(self.text) if size is None or size < 0 else min(self.pos + size, len(self.text))
+        out = self.text[self.pos:end]
+        self.pos = end
+        return out
+
+    def readline(self, size: int = -1) -> str:
+        end = self.text.find('\n', self.pos)
+        end = len(self.text) if end < 0 else end + 1
+        out = self.text[self.pos:end]
+        self.pos = end
+        if out.endswith('\r\n'):
+            out = out[:-2] + '\n'
+        return out
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
 class EisDataReader:
     """
     电化学阻抗谱(EIS)数据读取类，支持读取Gamry、Biologic、Zplot、Relaxis和CHI等格式的EIS数据文件
     """
     _known_sources = ['gamry', 'zplot', 'biologic', 'relaxis', 'CHI']
+    _mmap_threshold = 1 << 20  # 超过1MB的文件使用内存映射读取
     
     def __init__(self):
         """初始化EIS数据读取器"""
@@ -28,15 +177,16 @@ class EisDataReader:
         self.source = None
         self.timestamp = None
         self.file_path = None
+        self._text_cache = None  # 最近读取文件的(路径, 大小, 修改时间, 文本)，时间戳与数据解析共用
+        self._member_raw = None  # 最近读取的压缩包成员(成员路径, 原始字节, 成员修改时间秒或None)
     
     def get_extension(self, file: Union[Path, str]) -> str:
         """获取文件扩展名"""
-        file = Path(file)
-        return file.name.split('.')[-1].lower()
+        return source_name(file).split('.')[-1].lower()
     
     def get_file_source(self, text: str) -> Optional[str]:
         """确定文件来源"""
-        header = text.split('\n')[0]
+        header = _line(text)
         
         if header == 'EXPLAIN':
             return 'gamry'
@@ -64,14 +214,90 @@ class EisDataReader:
         except ValueError:
             return False
     
+    def sniff_encoding(self, prefix: bytes) -> tuple:
+        """
+        根据文件开头的字节判断编码
+
+        返回:
+        tuple: (编码, BOM字节数)。无BOM时为UTF-8，不是合法UTF-8时由decode改用_FALLBACK_ENCODINGS
+        """
+        for bom, encoding in _BOMS:
+            if prefix.startswith(bom):
+                return encoding, len(bom)
+        # 无BOM的UTF-16文本，ASCII字符的高位字节为0
+        if len(prefix) >= 4 and prefix[1] == 0 and prefix[3] == 0 and prefix[0] != 0:
+            return 'utf-16-le', 0
+        if len(prefix) >= 4 and prefix[0] == 0 and prefix[2] == 0 and prefix[1] != 0:
+            return 'utf-16-be', 0
+        return 'utf-8', 0
+
+    def decode(self, raw) -> str:
+        """
+        对原始字节(bytes或内存映射)解码，结果是文本的唯一一份拷贝
+
+        换行符保持原样(\r\n由_line和_TextView按行处理)。无BOM的文本先按UTF-8严格解码，
+        失败时依次尝试系统区域编码、cp1252、latin-1，使仪器软件写出的µ、°等字符不被替换
+        """
+        encoding, bom_len = self.sniff_encoding(bytes(raw[:4]))
+        data = memoryview(raw)[bom_len:]
+        if bom_len or encoding != 'utf-8':
+            return str(data, encoding, 'replace')
+        tried = set()
+        for encoding in ('utf-8',) + _FALLBACK_ENCODINGS:
+            if encoding == 'locale':
+                encoding = locale.getpreferredencoding(False)
+            name = codecs.lookup(encoding).name
+            if name in tried:
+                continue
+            tried.add(name)
+            try:
+                return str(data, encoding)
+            except UnicodeDecodeError:
+                continue
+        return str(data, 'latin-1')
+
+    def prime(self, file: Union[Path, str], raw: bytes, mtime: Optional[float] = None) -> None:
+        """提供压缩包成员已读出的原始字节(及成员头中的修改时间)，之后读取该成员时不再打开压缩包"""
+        self._member_raw = (str(file), raw, mtime)
+
+    def _member_bytes(self, file: Union[Path, str]) -> bytes:
+        if self._member_raw is None or self._member_raw[0] != str(file):
+            self._member_raw = (str(file), read_member(file), None)
+        return self._member_raw[1]
+
+    def _file_mtime(self, file: Union[Path, str]) -> float:
+        """文件的修改时间；压缩包成员取成员头中的时间，而不是压缩包的"""
+        if not is_member_path(file):
+            return os.stat(file).st_mtime
+        if self._member_raw is not None and self._member_raw[0] == str(file) \
+                and self._member_raw[2] is not None:
+            return self._member_raw[2]
+        return member_mtime(file)
+
     def read_txt(self, file: Union[Path, str]) -> str:
-        """读取文本文件，处理编码问题"""
-        try:
-            with open(file, 'r') as f:
-                return f.read()
-        except UnicodeDecodeError:
-            with open(file, 'r', encoding='latin1') as f:
-                return f.read()
+        """读取文本文件: 一次读取原始字节并解码，大文件使用内存映射"""
+        if is_member_path(file):
+            raw = self._member_bytes(file)
+            key = (str(file), len(raw), id(raw))
+            if self._text_cache is None or self._text_cache[:3] != key:
+                self._text_cache = key + (self.decode(raw),)
+            return self._text_cache[3]
+        with open(file, 'rb') as f:
+            st = os.fstat(f.fileno())
+            key = (str(file), st.st_size, st.st_mtime_ns)
+            if self._text_cache is not None and self._text_cache[:3] == key:
+                return self._text_cache[3]
+            if st.st_size >= self._mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)
+                    try:
+                        text = self.decode(view)
+                    finally:
+                        view.release()
+            else:
+                text = self.decode(f.read())
+        self._text_cache = key + (text,)
+        return text
     
     def check_source(self, source: str) -> None:
         """检查数据源是否被识别"""
@@ -96,15 +322,8 @@ class EisDataReader:
         """从pygamry生成的文件中获取时间戳"""
         txt = self.read_txt(file)
 
-        date_start = txt.find('DATE')
-        date_end = txt[date_start:].find('\n') + date_start
-        date_line = txt[date_start:date_end]
-        date_str = date_line.split('\t')[2]
-
-        time_start = txt.find('TIME')
-        time_end = txt[time_start:].find('\n') + time_start
-        time_line = txt[time_start:time_end]
-        time_str = time_line.split('\t')[2]
+        date_str = _line(txt, txt.find('DATE')).split('\t')[2]
+        time_str = _line(txt, txt.find('TIME')).split('\t')[2]
 
         dt_str = date_str + ' ' + time_str
         time_format_code = "%Y/%m/%d %H:%M:%S"    
@@ -116,8 +335,10 @@ class EisDataReader:
         """读取Biologic的MPR文件"""
         try:
             from galvani.BioLogic import MPRfile
-            file = Path(file)
-            return MPRfile(file.__str__())
+            if is_member_path(file):
+                import io
+                return MPRfile(io.BytesIO(self._member_bytes(file)))
+            return MPRfile(str(file))
         except ImportError:
             raise ImportError("无法导入MPRfile类，请确保安装了galvani库")
     
@@ -129,14 +350,8 @@ class EisDataReader:
         
         if source == 'gamry':
             try:
-                date_start = txt.find('DATE')
-                # print(date_start)
-                date_end = txt[date_start:].find('\n') + date_start
-                date = txt[date_start:date_end].split('\t')[2]
-
-                time_start = txt.find('TIME')
-                time_end = txt[time_start:].find('\n') + time_start
-                time_txt = txt[time_start:time_end].split('\t')[2]
+                date = _line(txt, txt.find('DATE')).split('\t')[2]
+                time_txt = _line(txt, txt.find('TIME')).split('\t')[2]
 
                 timestr = date + ' ' + time_txt
                 dt = datetime.strptime(timestr, "%Y/%m/%d %H:%M:%S")
@@ -146,13 +361,8 @@ class EisDataReader:
             # print(dt)
 
         elif source == 'zplot':
-            date_start = txt.find('Date')
-            date_end = txt[date_start:].find('\n') + date_start
-            date = txt[date_start:date_end].split()[1]
-
-            time_start = txt.find('Time')
-            time_end = txt[time_start:].find('\n') + time_start
-            time_txt = txt[time_start:time_end].split()[1]
+            date = _line(txt, txt.find('Date')).split()[1]
+            time_txt = _line(txt, txt.find('Time')).split()[1]
 
             timestr = date + ' ' + time_txt
             dt = datetime.strptime(timestr, "%Y-%m-%d %H:%M:%S")
@@ -169,7 +379,7 @@ class EisDataReader:
         elif source == 'CHI':
             try:
                 # 尝试解析CHI格式的时间戳
-                header = txt.split('\n')[0]
+                header = _line(txt)
                 header = header.replace("May", "May.")
                 header = header.replace("June", "Jun.")
                 header = header.replace("July", "Jul.")
@@ -177,7 +387,7 @@ class EisDataReader:
                 # dt = _is_chi_header()
             except ValueError:
                 warnings.warn("无法解析CHI格式的时间戳")
-                dt = datetime.fromtimestamp(Path(file).stat().st_mtime)
+                dt = datetime.fromtimestamp(self._file_mtime(file))
         
         self.timestamp = dt
         return dt
@@ -187,16 +397,16 @@ class EisDataReader:
         self.check_source(source)
         
         if source == 'gamry':
-            data_index = text.upper().find(data_start_str) + 1
+            data_index = text.find(data_start_str)
+            if data_index < 0:
+                data_index = text.upper().find(data_start_str)  # 大小写不同时才复制整段文本
+            data_index += 1
             pretxt = text[:data_index]
-            table_text = text[data_index:]
             
-            header_start = table_text.find('\n') + 1
-            header_end = header_start + table_text[header_start:].find('\n')
-            names = table_text[header_start:header_end].split('\t')
-            
-            unit_end = header_end + 1 + table_text[header_end + 1:].find('\n')
-            units = table_text[header_end + 1:unit_end].split('\t')
+            header_start = text.find('\n', data_index) + 1
+            header_end = text.find('\n', header_start)
+            names = _line(text, header_start).split('\t')
+            units = _line(text, header_end + 1).split('\t')
             
             skiprows = len(pretxt.split('\n')) + 2
 
@@ -221,7 +431,7 @@ class EisDataReader:
             else:
                 nh = 0
                 
-            header_row = text.split('\n')[nh - 1]
+            header_row = text.split('\n')[nh - 1].rstrip('\r')
             sep = '\t' if len(header_row.split('\t')) > 1 else ','
             
             names = header_row.split(sep)
@@ -249,7 +459,7 @@ class EisDataReader:
             header_index = text.find('\nData: ')
             skiprows = len(text[:header_index].split('\n')) + 2
             
-            header_line = text[header_index + 1:].split('\n')[0]
+            header_line = _line(text, header_index + 1)
             header = [h.replace('Data: ', '') for h in header_line.split('\t')]
             
             kwargs = dict(
@@ -274,7 +484,7 @@ class EisDataReader:
         
         return kwargs
     
-    def find_time_column(self, data: DataFrame) -> str:
+    def find_time_column(self, data: 'DataFrame') -> str:
         """查找时间列"""
         if self.source == 'gamry':        
             return np.intersect1d(['Time', 'T', 'time'], data.columns)[0]
@@ -283,16 +493,17 @@ class EisDataReader:
         else:
             raise ValueError(f"不支持的数据源 {self.source} 的时间列查找")
     
-    def append_timestamp(self, data: DataFrame) -> None:
+    def append_timestamp(self, data: 'DataFrame') -> None:
         """向数据中添加时间戳"""
+        import pandas as pd
+
         if self.timestamp is None:
             warnings.warn(f"无法为文件 {self.file_path} 添加时间戳，因为未设置时间戳")
             return
             
         try:
             # 查找时间列
-            time_col_candidates = ['Time', 'T', 'time', 'time/s', 'elapsed']
-            time_col = next((col for col in time_col_candidates if col in data.columns), None)
+            time_col = next((col for col in _TIME_COLUMNS if col in data.columns), None)
             # print(time_col)
             
             if time_col:
@@ -303,10 +514,10 @@ class EisDataReader:
             # else:
                 # warnings.warn(f"在文件 {self.file_path} 中找不到时间列")
         except Exception as err:
-            warnings.warn(f'为文件 {Path(self.file_path).name} 添加时间戳失败: {err}')
+            warnings.warn(f'为文件 {source_name(self.file_path)} 添加时间戳失败: {err}')
     
     def get_eis(self, file: Union[Path, str], min_freq: Optional[float] = None, 
-               max_freq: Optional[float] = None) -> DataFrame:
+               max_freq: Optional[float] = None, derived: bool = True) -> 'DataFrame':
         """
         读取 EIS 数据并返回DataFrame
         
@@ -314,17 +525,20 @@ class EisDataReader:
         file: 文件路径
         min_freq: 最小频率 (可选)
         max_freq: 最大频率 (可选)
+        derived: 为False时不计算Zmod、Zphz及逐行的timestamp列
         
         返回:
         DataFrame: 包含所有EIS数据的DataFrame
         """
+        import pandas as pd
+
         file_ext = self.get_extension(file)
-        file_path = Path(file)
+        file_name = source_name(file)
         
         # 处理MPR文件 (Biologic格式)
         if file_ext == 'mpr':
             try:
-                mpr = self.read_mpr(file_path)
+                mpr = self.read_mpr(file)
                 data = pd.DataFrame(mpr.data)
                 
                 # 标准化列名
@@ -344,8 +558,9 @@ class EisDataReader:
                         data.rename(columns={orig: new}, inplace=True)
                 
                 # 添加时间戳
+                self.source = 'biologic'
                 self.timestamp = mpr.timestamp or mpr.startdate
-                if 'time/s' in data.columns and self.timestamp:
+                if derived and 'time/s' in data.columns and self.timestamp:
                     data['timestamp'] = self.timestamp + pd.to_timedelta(data['time/s'], unit='s')
                 
                 return data
@@ -353,7 +568,7 @@ class EisDataReader:
                 raise RuntimeError(f"读取MPR文件失败: {e}")
         
         # 处理其他文本格式的EIS文件
-        text = self.read_txt(file_path)
+        text = self.read_txt(file)
         # print(text)
         
         # 尝试识别为CHI格式
@@ -362,14 +577,14 @@ class EisDataReader:
                 # 定位数据起始位置
                 index = text.find('Freq/Hz')
                 if index == -1:
-                    raise ValueError(f"在文件 {file_path.name} 中找不到 'Freq/Hz' 表头")
+                    raise ValueError(f"在文件 {file_name} 中找不到 'Freq/Hz' 表头")
                 
                 pretxt = text[:index]
                 header_index = len(pretxt.split('\n')) - 1
                 
-                # 读取数据
+                # 读取数据(直接解析已读入的文本，不再重新打开文件)
                 data = pd.read_csv(
-                    file_path, 
+                    _TextView(text), 
                     sep=',', 
                     skiprows=header_index,
                     skip_blank_lines=True
@@ -393,15 +608,15 @@ class EisDataReader:
                         data.rename(columns={orig: new}, inplace=True)
                 
                 # 添加计算列
-                if "Zreal" in data.columns and "Zimag" in data.columns:
+                if derived and "Zreal" in data.columns and "Zimag" in data.columns:
                     if "Zmod" not in data.columns:
                         data["Zmod"] = np.sqrt(data["Zreal"]**2 + data["Zimag"]**2)
                     if "Zphz" not in data.columns:
                         data["Zphz"] = np.arctan2(data["Zimag"], data["Zreal"]) * 180 / np.pi
                 
                 # 获取并添加时间戳
-                self.get_timestamp(file_path, source='CHI')
-                if self.timestamp and 'Time' in data.columns:
+                self.get_timestamp(file, source='CHI')
+                if derived and self.timestamp and 'Time' in data.columns:
                     data['timestamp'] = self.timestamp + pd.to_timedelta(data['Time'], unit='s')
                 
                 return data
@@ -434,27 +649,25 @@ class EisDataReader:
             # data = pd.read_csv(file_path, **kwargs)
             
             read_kw = {
-                'encoding': None,
-                'encoding_errors': 'ignore',
                 'engine': 'python'
             }
             read_kw.update(self._get_read_kwargs(text, source, data_start_str))
             # read_kw.update(kwargs)
             # print(read_kw)
             
-            data = pd.read_csv(file, **read_kw)
+            data = pd.read_csv(_TextView(text), **read_kw)
 
             
             # 获取并添加时间戳
-            self.get_timestamp(file_path, source)
-            if self.timestamp:
+            self.get_timestamp(file, source)
+            if derived and self.timestamp:
                 self.append_timestamp(data)
             
             # 重命名列为标准化名称
             if source == 'zplot':
                 col_map = {"Z'(a)": "Zreal", "Z''(b)": "Zimag", "Freq(Hz)": "Freq"}
                 data = data.rename(columns=col_map)
-                if "Zreal" in data.columns and "Zimag" in data.columns:
+                if derived and "Zreal" in data.columns and "Zimag" in data.columns:
                     data['Zmod'] = np.sqrt(data['Zreal']**2 + data['Zimag']**2)
                     data['Zphz'] = np.arctan2(data['Zimag'], data['Zreal']) * 180 / np.pi
             elif source == 'relaxis':
@@ -469,7 +682,34 @@ class EisDataReader:
             
             return data
         except Exception as e:
-            raise RuntimeError(f"读取文件 {file_path.name} 失败: {e}")
+            raise RuntimeError(f"读取文件 {file_name} 失败: {e}")
+
+    def get_spectrum(self, file: Union[Path, str], min_freq: Optional[float] = None,
+                     max_freq: Optional[float] = None) -> EisSpectrum:
+        """
+        读取EIS数据并返回紧凑的EisSpectrum，不生成派生列
+
+        参数:
+        file: 文件路径
+        min_freq: 最小频率 (可选)
+        max_freq: 最大频率 (可选)
+        """
+        data = self.get_eis(file, derived=False)
+
+        # 确保包含必要的列
+        if 'Freq' not in data.columns or 'Zreal' not in data.columns or 'Zimag' not in data.columns:
+            raise ValueError("数据中缺少必要的列 (Freq, Zreal, Zimag)")
+
+        z = np.empty(len(data), dtype=np.complex128)
+        z.real = data['Zreal'].to_numpy(dtype=np.float64)
+        z.imag = data['Zimag'].to_numpy(dtype=np.float64)
+        time_col = next((col for col in _TIME_COLUMNS if col in data.columns), None)
+        spectrum = EisSpectrum(data['Freq'].to_numpy(dtype=np.float64), z, self.source,
+                               self.timestamp,
+                               None if time_col is None else data[time_col].to_numpy(dtype=np.float64))
+        if min_freq is not None or max_freq is not None:
+            spectrum = spectrum.select(min_freq, max_freq)
+        return spectrum
 
     def get_eis_tuple(self, file: Union[Path, str], min_freq: Optional[float] = None, 
                      max_freq: Optional[float] = None) -> tuple:
@@ -484,26 +724,135 @@ class EisDataReader:
         返回:
         tuple: (频率数组, 复数阻抗数组)
         """
-        data = self.get_eis(file)
-        # print(data)
-        
-        # 确保包含必要的列
-        if 'Freq' not in data.columns or 'Zreal' not in data.columns or 'Zimag' not in data.columns:
-            raise ValueError("数据中缺少必要的列 (Freq, Zreal, Zimag)")
-        
-        freq = data['Freq'].values.copy()
-        z = data['Zreal'].values.copy() + 1j * data['Zimag'].values.copy()
+        return self.get_spectrum(file, min_freq, max_freq).as_tuple()
 
-        # 频率过滤
-        if min_freq is not None:
-            mask = freq >= min_freq
-            freq = freq[mask]
-            z = z[mask]
 
-        if max_freq is not None:
-            mask = freq <= max_freq
-            freq = freq[mask]
-            z = z[mask]
-        # print(z)
+class SpectrumCache:
+    """
+    会话内的已解析谱缓存(LRU)，以文件大小和修改时间校验，按数组占用字节数限制总大小
+
+    只改变拟合参数重新运行时，可直接从缓存取得EisSpectrum，无需重新读取文件
+    """
+    def __init__(self, reader: Optional[EisDataReader] = None, max_bytes: int = 256 << 20):
+        self.reader = reader if reader is not None else EisDataReader()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()  # 路径 -> (大小, 修改时间ns, EisSpectrum或None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self, path: str, key: tuple) -> tuple:
+        """读取文件并加入缓存，无法识别的文件也记录下来，避免每次重新尝试"""
+        try:
+            spectrum = self.reader.get_spectrum(path)
+            if spectrum.timestamp is None:
+                raise ValueError(f"无法获取文件 {source_name(path)} 的时间戳")
+        except Exception:
+            self._store(path, key + (None,))
+            raise
+        entry = key + (spectrum,)
+        self._store(path, entry)
+        return entry
+
+    def _store(self, path: str, entry: tuple) -> None:
+        self.pop(path)
+        self._entries[path] = entry
+        self.nbytes += self._entry_bytes(entry)
+        # 淘汰最久未使用的谱
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            self.pop(next(iter(self._entries)))
+
+    def _entry_bytes(self, entry: tuple) -> int:
+        return 0 if entry[2] is None else entry[2].nbytes
+
+    def get_spectrum(self, file: Union[Path, str]) -> Optional[EisSpectrum]:
+        """
+        获取谱，文件大小或修改时间变化时重新读取
+
+        返回:
+        EisSpectrum: 无法识别的文件返回None
+        """
+        path = normalize_path(file)
+        # 压缩包成员以压缩包本身的大小和修改时间校验
+        st = os.stat(split_member(path)[0])
+        key = (st.st_size, st.st_mtime_ns)
+        entry = self._entries.get(path)
+        if entry is None or entry[:2] != key:
+            entry = self._load(path, key)
+        else:
+            self._entries.move_to_end(path)
+        return entry[2]
+
+    def load_archive(self, archive: Union[Path, str], members: list,
+                     workers: Optional[int] = None) -> int:
+        """
+        批量读取压缩包中尚未缓存的成员，zip并行解压，tar顺序流式读取一遍
+
+        参数:
+        members: 成员名列表
+
+        返回:
+        int: 新读取的成员数
+        """
+        archive = os.path.abspath(archive)
+        st = os.stat(archive)
+        key = (st.st_size, st.st_mtime_ns)
+        todo = [m for m in members
+                if (self._entries.get(member_path(archive, m)) or (None, None))[:2] != key]
+        if not todo:
+            return 0
+        local = threading.local()
+
+        def parse(path, raw, mtime):
+            # EisDataReader保存最近读取的状态，每个线程使用各自的实例
+            if getattr(local, 'reader', None) is None:
+                local.reader = EisDataReader()
+            local.reader.prime(path, raw, mtime)
+            try:
+                return local.reader.get_spectrum(path)
+            finally:
+                # 不保留原始字节和文本
+                local.reader._member_raw = local.reader._text_cache = None
+
+        for path, result in load_members(archive, todo, parse, workers):
+            if isinstance(result, Exception) or result.timestamp is None:
+                self._store(path, key + (None,))
+            else:
+                self._store(path, key + (result,))
+        return len(todo)
+
+    def get(self, file: Union[Path, str]) -> tuple:
+        """
+        返回:
+        tuple: (时间戳, 频率数组, 复数阻抗数组)，无法识别的文件时间戳为None
+        """
+        spectrum = self.get_spectrum(file)
+        if spectrum is None:
+            return None, None, None
+        return (spectrum.timestamp,) + spectrum.as_tuple()
+
+    def get_timestamp(self, file: Union[Path, str]) -> Optional[datetime]:
+        spectrum = self.get_spectrum(file)
+        return None if spectrum is None else spectrum.timestamp
+
+    def get_eis_tuple(self, file: Union[Path, str]) -> tuple:
+        spectrum = self.get_spectrum(file)
+        if spectrum is None:
+            raise ValueError(f"无法识别文件 {source_name(file)}")
+        return spectrum.as_tuple()
+
+    def pop(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.nbytes -= self._entry_bytes(entry)
+
+    def retain(self, files) -> None:
+        """仅保留当前选择中的文件"""
+        keep = {normalize_path(f) for f in files}
+        for path in [p for p in self._entries if p not in keep]:
+            self.pop(path)
 
-        return freq, z
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
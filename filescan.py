@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+基于os.scandir的数据文件发现，打开文件之前先按扩展名和文件名过滤
+"""
+
+import os
+from typing import Union, Optional
+from pathlib import Path
+from archivesource import is_archive, list_members
+
+# 各工作站EIS数据的扩展名(小写)
+EIS_EXTENSIONS = ('.txt', '.csv', '.dta', '.mpr', '.z')
+# 本工具自身输出文件的文件名特征
+OUTPUT_PREFIXES = ('DRT_Fit_Results_',)
+OUTPUT_SUFFIXES = ('_merged.txt', '_sampled.txt')
+
+
+def is_output_file(name: str) -> bool:
+    """是否为本工具生成的结果文件"""
+    return name.startswith(OUTPUT_PREFIXES) or name.endswith(OUTPUT_SUFFIXES)
+
+
+class FolderScanner:
+    """
+    文件夹扫描器，按文件名筛选候选文件并给出(大小, 修改时间)；
+    两次运行之间的增量判断由timeindex.TimestampIndex负责
+
+    参数:
+    extensions: 需要的扩展名，None表示不按扩展名过滤
+    """
+    def __init__(self, extensions: Optional[tuple] = EIS_EXTENSIONS):
+        self.extensions = None if extensions is None else tuple(e.lower() for e in extensions)
+
+    def is_candidate(self, name: str) -> bool:
+        """仅凭文件名判断是否需要处理"""
+        if is_output_file(name):
+            return False
+        if self.extensions is None:
+            return True
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def scan(self, folder: Union[Path, str]) -> list:
+        """
+        扫描文件夹(不递归)，不打开任何文件；压缩包列出其中的文件(含子目录)，不解压
+
+        返回:
+        list: [(绝对路径, 大小, 修改时间ns), ...]，按文件名排序
+        """
+        if is_archive(folder):
+            return list_members(folder, self.is_candidate)
+        entries = []
+        with os.scandir(os.path.abspath(folder)) as it:
+            for entry in it:
+                # is_file在多数平台上直接使用目录项类型，不额外stat
+                if not self.is_candidate(entry.name) or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, st.st_size, st.st_mtime_ns))
+        entries.sort(key=lambda x: x[0])
+        return entries
+
+    def list_files(self, folder: Union[Path, str]) -> list:
+        """返回文件夹中所有候选文件的路径"""
+        return [path for path, _, _ in self.scan(folder)]
@@ -11,6 +11,7 @@ from tkinter.filedialog import askdirectory, askopenfilenames
 import os
 from tkinter import simpledialog
 import sys
+from archivesource import is_archive
 
 class FolderSelector(tk.Tk):
     def __init__(self, process_callback, show_buttons=None):
@@ -21,6 +22,8 @@ class FolderSelector(tk.Tk):
         self.as_one = False  # 存储一个布尔值
         self.flag_text = '仅保留第一个x轴'
         self.lambda_value = 10.0
+        self.lambda_mode = 'fixed'  # lambda选择方式: fixed/cv/lcurve/discrepancy
+        self.time_window = None  # 选择文件夹时的时间窗口，None表示全部
         self.process_callback = process_callback
         self.dop_value = 10.0  # DOP参数默认值
         self.ask_for_dop = False  # 是否需要询问DOP参数
@@ -88,6 +91,12 @@ class FolderSelector(tk.Tk):
             self.lambda_button = ttk.Button(self.left_frame, text="设置lambda值 (当前: 10)",
                                             command=self.set_lambda_value, width=40)
             self.lambda_button.pack(pady=10)
+            self.lambda_mode_button = ttk.Button(self.left_frame, text="lambda选择方式: fixed",
+                                                 command=self.switch_lambda_mode, width=40)
+            self.lambda_mode_button.pack(pady=10)
+            self.time_window_button = ttk.Button(self.left_frame, text="时间窗口: 全部",
+                                                 command=self.set_time_window, width=40)
+            self.time_window_button.pack(pady=10)
         
         for button_name in show_buttons:
             self.create_button(button_name)
@@ -126,8 +135,15 @@ class FolderSelector(tk.Tk):
                        ("CHI csv files", "*.csv"),
                        ("Gamry files", "*.DTA"), 
                        ("BioLogic files", "*.mpr"), 
+                       ("Archives", "*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tar.xz"),
                        ("All files", "*.*")]
         )
+        if len(files_selected) == 1 and is_archive(files_selected[0]):
+            # 压缩包按文件夹处理，其中的文件直接读取，无需解压
+            self.selected_items = [files_selected[0]]
+            self.is_file_selection = False
+            self.path_var.set(files_selected[0])
+            return
         if files_selected:
             self.selected_items = list(files_selected)  # 存储为列表
             self.is_file_selection = True
@@ -184,6 +200,29 @@ class FolderSelector(tk.Tk):
             # 输入非数字时的处理
             tk.messagebox.showerror("输入错误", "请输入有效的浮点数!")
 
+    def switch_lambda_mode(self):
+        """在固定lambda与各自动选择准则之间切换"""
+        modes = ['fixed', 'cv', 'lcurve', 'discrepancy']
+        self.lambda_mode = modes[(modes.index(self.lambda_mode) + 1) % len(modes)]
+        self.lambda_mode_button.config(text=f"lambda选择方式: {self.lambda_mode}")
+        
+    def set_time_window(self):
+        """弹出对话框设置时间窗口，仅对选择的文件夹生效"""
+        from timeindex import parse_time_window, describe_window
+
+        text = simpledialog.askstring(
+            "时间窗口",
+            "空格分隔的 键=值，留空表示全部，例如:\n"
+            "start=2026-01-01T08:00 end=2026-01-08 every=2h max=500\n"
+            "stride=N 每N个取一个; every=30m/2h/1d 每段时间取一个; max=N 均匀选取至多N个")
+        if text is None:  # 用户取消
+            return
+        try:
+            self.time_window = parse_time_window(text) if text.strip() else None
+            self.time_window_button.config(text=f"时间窗口: {describe_window(self.time_window)}")
+        except ValueError as e:
+            tk.messagebox.showerror("输入错误", str(e))
+
     def key_select(self, button_text):
         """根据点击的按钮返回不同的值"""
         self.button_label.config(text=f"选择了{button_text}格式")
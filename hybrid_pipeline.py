@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+EIS + 计时电位(CP)混合DRT拟合的批处理
+
+每个EIS谱按时间就近配对一个CP文件，CP信号先流式降采样到固定点数，
+使每次拟合的规模有上限，再调用hybdrt的fit_hybrid。结果表格与DRT_DOP_all相同。
+
+用法:
+    python hybrid_pipeline.py EIS文件夹 [--cp-folder CP文件夹] [--lambda 10] [--dop 10]
+                              [--points 400] [--method event] [--max-gap 1h] [--output 文件夹]
+"""
+
+import os
+import sys
+import inspect
+import argparse
+from datetime import timedelta
+import numpy as np
+from drt_pipeline import (FIXED_BASIS_TAU, DOP_LAMBDA_START, predict_fit, resolve_lambdas, build_fit_tables,
+                          result_name, save_fit_tables)
+from drt_peaks import peak_table, save_peak_table
+from filescan import FolderScanner
+from timeindex import TimestampIndex, parse_interval
+
+# 流式降采样模块位于EIS-CP_data_sampling文件夹中
+SAMPLING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'EIS-CP_data_sampling')
+
+
+def _sampling():
+    if SAMPLING_DIR not in sys.path:
+        sys.path.insert(0, SAMPLING_DIR)
+    import sampling
+    return sampling
+
+
+def is_chrono_file(path):
+    """文件头中有 'Time/' 数据列的CHI文件视为计时(CP/CA)数据"""
+    try:
+        _sampling().read_chi_header(path)
+        return True
+    except Exception:
+        return False
+
+
+def _timestamp_reader(reader=None):
+    """计时文件只读文件头获取时间戳，避免为建索引读入整个长时间序列"""
+    if reader is None:
+        from fileload_all_eis import EisDataReader
+        reader = EisDataReader()
+
+    def read(path):
+        try:
+            return _sampling().read_chi_header(path)['timestamp']
+        except ValueError:
+            return reader.get_timestamp(path)
+    return read
+
+
+def pair_by_timestamp(eis_items, cp_items, max_gap=timedelta(hours=1)):
+    """
+    为每个EIS谱配对时间最近的CP文件
+
+    参数:
+    eis_items, cp_items: [(路径, 时间戳), ...]
+    max_gap: 允许的最大时间差，超过时该EIS谱不参与混合拟合
+
+    返回:
+    list: [(EIS路径, 时间戳, CP路径), ...]，按EIS时间排序
+    """
+    if not eis_items or not cp_items:
+        return []
+    cp_items = sorted(cp_items, key=lambda x: x[1])
+    t0 = cp_items[0][1]
+    t_cp = np.array([(t - t0).total_seconds() for _, t in cp_items])
+    t_eis = np.array([(t - t0).total_seconds() for _, t in eis_items])
+    idx = np.clip(np.searchsorted(t_cp, t_eis), 1, max(len(t_cp) - 1, 1))
+    if len(t_cp) > 1:
+        idx = np.where(t_eis - t_cp[idx - 1] <= t_cp[idx] - t_eis, idx - 1, idx)
+    else:
+        idx = np.zeros(len(t_eis), dtype=int)
+    gap = np.abs(t_eis - t_cp[idx])
+    pairs = [(path, ts, cp_items[i][0])
+             for (path, ts), i, g in zip(eis_items, idx, gap) if g <= max_gap.total_seconds()]
+    return sorted(pairs, key=lambda x: x[1])
+
+
+def check_fit_kwargs(method, kwargs):
+    """
+    检查传给hybdrt拟合方法的关键字参数都是该方法签名中明确列出的参数
+
+    hybdrt的参数名在版本间有变化，拼错或已改名的参数若被**kwargs吸收会被静默忽略，
+    因此不在签名中显式列出的参数一律报错
+    """
+    named = [name for name, p in inspect.signature(method).parameters.items()
+             if p.kind not in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD)]
+    unknown = [k for k in kwargs if k not in named]
+    if unknown:
+        raise TypeError(f"{getattr(method, '__qualname__', method)} 不接受参数 {', '.join(unknown)}，"
+                        f"可用参数: {', '.join(named)}")
+
+
+def fit_hybrid_tuple(eis_tup, chrono_tup, l2_lambda_0, fit_dop=False,
+                     dop_l2_lambda_0=DOP_LAMBDA_START, fixed_basis_tau=FIXED_BASIS_TAU,
+                     eis_drt=None):
+    """
+    对一对EIS谱与CP信号进行hybdrt混合拟合
+
+    参数:
+    chrono_tup: (times, i_signal, v_signal)，电流恒定时以第一个时间点作为阶跃时刻
+    dop_l2_lambda_0: DOP的lambda，仅在fit_dop为True时使用
+    eis_drt: 复用的hybdrt实例(选择lambda时反复拟合)，为None时新建
+    """
+    if eis_drt is None:
+        from hybdrt.models import DRT
+        eis_drt = DRT(fit_dop=fit_dop, fixed_basis_tau=fixed_basis_tau)
+
+    times, i_signal, v_signal = chrono_tup
+    fit_kwargs = {'l2_lambda_0': l2_lambda_0, 'nonneg': False}
+    if fit_dop:
+        fit_kwargs['dop_l2_lambda_0'] = dop_l2_lambda_0
+    if np.ptp(i_signal) <= 1e-3 * np.max(np.abs(i_signal)):
+        fit_kwargs['step_times'] = np.array([times[0]])
+    check_fit_kwargs(eis_drt.fit_hybrid, fit_kwargs)
+    eis_drt.fit_hybrid(times, i_signal, v_signal, *eis_tup, **fit_kwargs)
+    return eis_drt
+
+
+def find_pairs(folder, cp_folder=None, max_gap=timedelta(hours=1), reader=None):
+    """用时间戳索引列出EIS与CP文件并按时间配对"""
+    scanner = FolderScanner()
+    eis_items, cp_items = [], []
+    for item_folder in dict.fromkeys([folder, cp_folder or folder]):
+        index = TimestampIndex(item_folder, scanner=scanner,
+                               timestamp_func=_timestamp_reader(reader))
+        index.update()
+        for name, ts in index.items():
+            path = os.path.join(index.folder, name)
+            (cp_items if is_chrono_file(path) else eis_items).append((path, ts))
+    return pair_by_timestamp(eis_items, cp_items, max_gap)
+
+
+def run_hybrid_batch(folder, cp_folder=None, l2_lambda_0=10.0, n_points=400, method='event',
+                     max_gap=timedelta(hours=1), fit_dop=False, output_folder=None,
+                     i_signal=None, fit_func=fit_hybrid_tuple, dop_l2_lambda_0=DOP_LAMBDA_START):
+    """
+    混合拟合整个文件夹，输出DRT_Fit_Results_*表格(汇总表中附带配对的CP文件)
+
+    参数:
+    l2_lambda_0, dop_l2_lambda_0: 数值或准则名称(见FIT_LAMBDA_METHODS)。为准则名称时在该对数据的
+        fit_hybrid拟合上选择(CP信号始终参与拟合，交叉验证只轮换EIS频率点)，两者分别选择
+    n_points: 每个CP信号降采样后的点数上限
+    method: 降采样方法，见sampling.sample_file
+    i_signal: CP文件中没有电流信息时使用的恒定电流(A)
+
+    返回:
+    str: 结果文件名，没有可配对的文件时为None
+    """
+    from fileload_all_eis import SpectrumCache
+
+    cache = SpectrumCache()
+    sampling = _sampling()
+    pairs = find_pairs(folder, cp_folder, max_gap, cache.reader)
+    if not pairs:
+        print("没有找到时间相近的EIS/CP文件对")
+        return None
+
+    records, cp_files = [], {}
+    nu = None
+    for eis_path, timestamp, cp_path in pairs:
+        name = os.path.basename(eis_path)
+        try:
+            eis_tup = cache.get_eis_tuple(eis_path)
+            times, i_values, v_values, _ = sampling.get_chrono_signals(
+                cp_path, method, n_points, i_signal=i_signal)
+            chrono_tup = (times, i_values, v_values)
+
+            def fit_pair(tup, lam, fit_dop, dop_lam, tau, eis_drt=None):
+                return fit_func(tup, chrono_tup, lam, fit_dop=fit_dop, dop_l2_lambda_0=dop_lam,
+                                fixed_basis_tau=tau, eis_drt=eis_drt)
+
+            # 自动选择lambda时在混合拟合本身上选择，不借用纯EIS拟合的lambda
+            lam, dop_lam = resolve_lambdas(eis_tup, l2_lambda_0, dop_l2_lambda_0, fit_dop,
+                                           fit_func=fit_pair)
+            eis_drt = fit_pair(eis_tup, lam, fit_dop, dop_lam, FIXED_BASIS_TAU)
+            gamma, nu_i, dop = predict_fit(eis_drt, fit_dop)
+        except Exception as e:
+            print(f"Error processing {name} + {os.path.basename(cp_path)}: {e}")
+            continue
+        if nu_i is not None:
+            nu = nu_i
+        records.append((name, timestamp, gamma, dop, (lam, dop_lam if fit_dop else np.nan)))
+        cp_files[name] = (os.path.basename(cp_path), len(times))
+        cache.pop(os.path.abspath(eis_path))  # 每个谱只用一次，不必保留
+
+    if not records:
+        return None
+    data, data_dop, summary = build_fit_tables(records, nu, fit_dop)
+    summary['cp_file'] = [cp_files[name][0] for name in summary['file']]
+    summary['cp_points'] = [cp_files[name][1] for name in summary['file']]
+
+    output_folder = output_folder or folder
+    plt_name = result_name(records[0][0], l2_lambda_0) + '_hybrid'
+    save_fit_tables(data, data_dop, output_folder, plt_name, summary)
+    table = peak_table(np.vstack([r[2] for r in records]), FIXED_BASIS_TAU,
+                       [r[0] for r in records], [r[1] for r in records])
+    save_peak_table(table, output_folder, plt_name)
+    return plt_name
+
+
+def main(argv=None):
+    from drt_pipeline import FIT_LAMBDA_METHODS
+    from workqueue_eis import _lambda_arg
+
+    parser = argparse.ArgumentParser(description='EIS + CP混合DRT批量拟合')
+    parser.add_argument('folder', help='EIS文件夹(CP文件也可在同一文件夹中)')
+    parser.add_argument('--cp-folder', default=None, help='CP文件所在文件夹')
+    parser.add_argument('--lambda', dest='l2_lambda_0', type=_lambda_arg, default=10.0,
+                        help=f'数值或自动选择准则({"/".join(FIT_LAMBDA_METHODS)})，在混合拟合上选择')
+    parser.add_argument('--dop', dest='dop_l2_lambda_0', type=_lambda_arg, default=None,
+                        help='同时拟合DOP，值为DOP的lambda(数值或准则名称)')
+    parser.add_argument('--points', type=int, default=400, help='CP信号降采样后的点数')
+    parser.add_argument('--method', default='event', choices=('log', 'lttb', 'event'))
+    parser.add_argument('--max-gap', default='1h', help='EIS与CP的最大时间差，如 30m、2h')
+    parser.add_argument('--current', type=float, default=None, help='CP的恒定电流(A)')
+    parser.add_argument('--output', default=None, help='结果输出文件夹')
+    args = parser.parse_args(argv)
+
+    plt_name = run_hybrid_batch(args.folder, args.cp_folder, args.l2_lambda_0, args.points,
+                                args.method, parse_interval(args.max_gap),
+                                args.dop_l2_lambda_0 is not None, args.output, args.current,
+                                dop_l2_lambda_0=(DOP_LAMBDA_START if args.dop_l2_lambda_0 is None
+                                                 else args.dop_l2_lambda_0))
+    if plt_name:
+        print(f"已保存 {plt_name}")
+
+
+if __name__ == "__main__":
+    main()
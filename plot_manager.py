@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+常驻的结果图窗口: 图形、坐标轴和每个谱的曲线在多次运行之间保留
+
+每次更新只对新增或变化的谱调用set_data；坐标范围与图例不变且只有新增的谱时，
+只把新曲线画到已有画面上再blit对应的子图，开销与变化的谱数成正比，与总谱数无关。
+有谱被修改或删除、坐标范围变化时才整体重绘。
+"""
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+SUBPLOT_TITLES = ("DRT 分布", "DOP 分布", "EIS 拟合结果", "拟合残差")
+# 每个谱的各artist所在的子图序号
+ARTIST_AXES = {'drt': 0, 'ci': 0, 'dop': 1, 'data': 2, 'fit': 2, 'res': 3}
+
+
+class SpectrumSeries:
+    """单个谱在四个子图中所需的数据"""
+    __slots__ = ('tau', 'gamma', 'ci', 'dop_x', 'dop', 'freq', 'z', 'z_fit')
+
+    def __init__(self, tau, gamma, freq, z, z_fit, ci=None, dop_x=None, dop=None):
+        self.tau, self.gamma, self.ci = tau, gamma, ci
+        self.dop_x, self.dop = dop_x, dop
+        self.freq, self.z, self.z_fit = freq, z, z_fit
+
+    def signature(self):
+        """用于判断谱是否变化"""
+        parts = [self.gamma, self.z, self.dop]
+        parts += list(self.ci) if self.ci is not None else [None]
+        # None也占一个位置，使"有无DOP/区间"的变化也改变签名
+        return hash(tuple(None if p is None else np.ascontiguousarray(p).tobytes() for p in parts))
+
+
+class PlotManager:
+    """
+    嵌入Tk窗口的2×2结果图，保留每个谱的曲线对象以便原位更新
+
+    参数:
+    master: 放置画布的Tk容器
+    figsize: 图形尺寸(英寸)
+    max_legend: 谱数不超过该值时显示图例
+    """
+    def __init__(self, master, figsize=(10, 8), max_legend=20):
+        self.master = master
+        self.max_legend = max_legend
+        self.fig = Figure(figsize=figsize)
+        self.axes = self.fig.subplots(2, 2).flatten()
+        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        self.artists = {}  # 谱名 -> {ARTIST_AXES中的键: artist或None}
+        self.colors = {}
+        self.signatures = {}
+        self.n_colors = 0
+        self.dop_enabled = None
+        self.legend_labels = None
+        self._setup_axes(True)
+
+    def alive(self):
+        try:
+            return bool(self.canvas.get_tk_widget().winfo_exists())
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.canvas.get_tk_widget().destroy()
+        except Exception:
+            pass
+        self.fig.clear()
+        self.artists.clear()
+        self.colors.clear()
+
+    def _setup_axes(self, dop_enabled):
+        ax_drt, ax_dop, ax_nyq, ax_res = self.axes
+        for ax, title in zip(self.axes, SUBPLOT_TITLES):
+            ax.set_title(title, fontsize=12)
+            ax.grid(True, linestyle='--', alpha=0.5)
+        ax_drt.set_xscale('log')
+        ax_drt.set_xlim(1e-7, 1e2)
+        ax_drt.set_xlabel(r'$\tau$ (s)')
+        ax_drt.set_ylabel(r'$\gamma$ ($\Omega$)')
+        ax_dop.set_xlim(0, 90)
+        ax_dop.set_xlabel(r'$\theta$ ($^\circ$)')
+        ax_nyq.set_xlabel(r"$Z'$ ($\Omega$)")
+        ax_nyq.set_ylabel(r"$-Z''$ ($\Omega$)")
+        ax_nyq.set_aspect('equal', adjustable='datalim')
+        ax_res.set_xscale('log')
+        ax_res.set_xlabel('f (Hz)')
+        ax_res.set_ylabel(r"$\Delta Z''$ ($\Omega$)")
+        self._set_dop_text(dop_enabled)
+
+    def _set_dop_text(self, dop_enabled):
+        ax_dop = self.axes[1]
+        for text in list(ax_dop.texts):
+            text.remove()
+        if not dop_enabled:
+            ax_dop.text(0.5, 0.5, "DOP未开启", ha='center', va='center', transform=ax_dop.transAxes)
+        self.dop_enabled = dop_enabled
+
+    # ---------------- 曲线 ----------------
+    def _band(self, key, x, bounds, color):
+        """近似模型的区间带，bounds为None时不画"""
+        if bounds is None:
+            return None
+        return self.axes[ARTIST_AXES[key]].fill_between(x, bounds[0], bounds[1], color=color,
+                                                        alpha=0.2, lw=0)
+
+    def _create(self, label, s, color):
+        """为一个谱创建各子图中的曲线"""
+        ax_drt, ax_dop, ax_nyq, ax_res = self.axes
+        fmt = dict(color=color, alpha=0.7)
+        arts = {'drt': ax_drt.plot(s.tau, s.gamma, ls='-.', label=label, **fmt)[0],
+                'ci': self._band('ci', s.tau, s.ci, color), 'dop': None}
+        if s.dop is not None:
+            arts['dop'] = ax_dop.plot(s.dop_x, s.dop, ls='-.', label=label, **fmt)[0]
+        arts['data'] = ax_nyq.plot(s.z.real, -s.z.imag, 'o', ms=3, mfc='none', **fmt)[0]
+        arts['fit'] = ax_nyq.plot(s.z_fit.real, -s.z_fit.imag, '-', **fmt)[0]
+        arts['res'] = ax_res.plot(s.freq, (s.z_fit - s.z).imag, 'o', ms=3, mfc='none', **fmt)[0]
+        return arts
+
+    def _update(self, label, s):
+        """
+        已有曲线原位更新数据，区间带重新生成；
+        DOP曲线随谱是否带有DOP结果新建或移除(如预览结果被完整拟合替换、DOP开关切换)
+        """
+        arts, color = self.artists[label], self.colors[label]
+        arts['drt'].set_data(s.tau, s.gamma)
+        if arts['ci'] is not None:
+            arts['ci'].remove()
+        arts['ci'] = self._band('ci', s.tau, s.ci, color)
+        if s.dop is None:
+            if arts['dop'] is not None:
+                arts['dop'].remove()
+                arts['dop'] = None
+                self.legend_labels = None  # DOP图中的曲线变化，需重建图例
+        else:
+            if arts['dop'] is None:
+                arts['dop'] = self.axes[1].plot(s.dop_x, s.dop, ls='-.', label=label,
+                                                color=color, alpha=0.7)[0]
+                self.legend_labels = None
+            else:
+                arts['dop'].set_data(s.dop_x, s.dop)
+        arts['data'].set_data(s.z.real, -s.z.imag)
+        arts['fit'].set_data(s.z_fit.real, -s.z_fit.imag)
+        arts['res'].set_data(s.freq, (s.z_fit - s.z).imag)
+
+    def _remove(self, label):
+        for art in self.artists.pop(label).values():
+            if art is not None:
+                art.remove()
+        self.colors.pop(label, None)
+        self.signatures.pop(label, None)
+
+    def _limits(self):
+        return np.array([ax.get_xlim() + ax.get_ylim() for ax in self.axes])
+
+    # ---------------- 更新 ----------------
+    def update(self, series, dop_enabled=False, colormap='tab20c'):
+        """
+        用新的结果更新图形
+
+        参数:
+        series: 有序字典 谱名 -> SpectrumSeries
+        dop_enabled: 是否开启了DOP
+
+        返回:
+        str: 'none'(无变化)、'blit'(只增量绘制新谱) 或 'full'(整体重绘)
+        """
+        from matplotlib import colormaps
+
+        cmap = colormaps[colormap]
+        full = dop_enabled != self.dop_enabled
+        if full:
+            self._set_dop_text(dop_enabled)
+        for label in [lb for lb in self.artists if lb not in series]:
+            self._remove(label)
+            full = True
+
+        limits_before = self._limits()
+        added = []
+        for label, s in series.items():
+            sig = s.signature()
+            if label not in self.artists:
+                # 颜色按加入顺序循环取用，已有谱的颜色不随谱数变化
+                color = cmap(self.n_colors % cmap.N)
+                self.n_colors += 1
+                self.colors[label] = color
+                self.artists[label] = self._create(label, s, color)
+                added.append(label)
+            elif sig != self.signatures[label]:
+                self._update(label, s)
+                full = True
+            self.signatures[label] = sig
+
+        if not added and not full:
+            return 'none'
+
+        for ax in self.axes:
+            ax.relim(visible_only=True)
+            ax.autoscale_view()
+            ax.apply_aspect()  # Nyquist图等比例，先确定最终范围再比较
+        self.axes[0].set_xlim(1e-7, 1e2)
+        self.axes[1].set_xlim(0, 90)
+        full |= not np.allclose(self._limits(), limits_before, rtol=1e-9, atol=0)
+        full |= self._update_legends(list(series))
+
+        if full:
+            self.fig.tight_layout()
+            self.canvas.draw_idle()
+            return 'full'
+        self._blit(added)
+        return 'blit'
+
+    def _update_legends(self, labels):
+        """返回图例是否变化"""
+        shown = labels if len(labels) <= self.max_legend else []
+        if shown == self.legend_labels:
+            return False
+        for ax in self.axes[:2]:
+            if ax.get_legend():
+                ax.get_legend().remove()
+            if shown and ax.get_lines():
+                ax.legend(fontsize=4)
+        self.legend_labels = shown
+        return True
+
+    def _blit(self, labels):
+        """把新增谱的曲线直接画到当前画面上，只刷新包含它们的子图"""
+        dirty = set()
+        for label in labels:
+            for key, art in self.artists[label].items():
+                if art is not None:
+                    self.axes[ARTIST_AXES[key]].draw_artist(art)
+                    dirty.add(ARTIST_AXES[key])
+        for i in sorted(dirty):
+            self.canvas.blit(self.axes[i].bbox)
+
+    def save(self, path, dpi=300):
+        self.fig.savefig(path, dpi=dpi)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+文件夹的时间戳索引及按时间窗口选谱，用于长时间测试中只拟合部分谱
+
+索引保存在文件夹内的 .eis_timestamps.json 中，以(大小, 修改时间)校验，
+再次打开同一文件夹时只读取新增或变化的文件。folder也可以是zip/tar压缩包，
+此时索引保存在压缩包旁的 压缩包名.eis_timestamps.json 中，以成员名为键。
+
+用法:
+    python timeindex.py 文件夹 [--start "2026-01-01 00:00"] [--end ...] [--stride 5]
+                               [--every 2h] [--max-count 200]
+"""
+
+import os
+import re
+import json
+import argparse
+from datetime import datetime, timedelta, time
+from typing import Union, Optional
+from pathlib import Path
+import numpy as np
+from filescan import FolderScanner
+from archivesource import is_archive, split_member, iter_members
+
+INDEX_FILE = '.eis_timestamps.json'
+_UNITS = {'s': 1, 'm': 60, 'min': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_time(value) -> Optional[datetime]:
+    """解析 'YYYY-mm-dd[ HH:MM[:SS]]' 形式的时间，空值返回None"""
+    if value is None or isinstance(value, datetime):
+        return value
+    value = value.strip()
+    return datetime.fromisoformat(value) if value else None
+
+
+def parse_interval(value) -> Optional[timedelta]:
+    """解析 '30m'、'2h'、'1.5d' 形式的时间间隔，纯数字按小时计"""
+    if value is None or isinstance(value, timedelta):
+        return value
+    match = re.fullmatch(r'\s*([\d.]+)\s*(s|m|min|h|d)?\s*', str(value))
+    if match is None:
+        raise ValueError(f'无法解析时间间隔 {value}，示例: 30m、2h、1d')
+    return timedelta(seconds=float(match.group(1)) * _UNITS[match.group(2) or 'h'])
+
+
+def parse_time_window(text: str) -> dict:
+    """
+    解析GUI中输入的时间窗口，空格分隔的 键=值，例如:
+        start=2026-01-01T08:00 end=2026-01-08 every=2h max=500
+
+    返回:
+    dict: 可直接传给TimestampIndex.select的参数
+    """
+    keys = {'start': 'start', 'end': 'end', 'stride': 'stride', 'every': 'every',
+            'max': 'max_count', 'max_count': 'max_count'}
+    window = {}
+    for token in text.split():
+        key, sep, value = token.partition('=')
+        if not sep or key not in keys:
+            raise ValueError(f'无法解析 {token}，可用的键: start、end、stride、every、max')
+        window[keys[key]] = value
+    return normalize_window(window)
+
+
+def normalize_window(window: Optional[dict]) -> dict:
+    """将字符串形式的时间窗口参数转换为select所需的类型"""
+    window = dict(window or {})
+    window['start'] = parse_time(window.get('start'))
+    window['end'] = parse_time(window.get('end'))
+    window['every'] = parse_interval(window.get('every'))
+    for key in ('stride', 'max_count'):
+        window[key] = int(window[key]) if window.get(key) else None
+    return window
+
+
+def describe_window(window: Optional[dict]) -> str:
+    """时间窗口的简短文字说明，用于按钮显示"""
+    if not window or not any(window.values()):
+        return '全部'
+    parts = []
+    if window.get('start'):
+        parts.append(f"{window['start']:%Y-%m-%d %H:%M}起")
+    if window.get('end'):
+        parts.append(f"至{window['end']:%Y-%m-%d %H:%M}")
+    if window.get('stride'):
+        parts.append(f"每{window['stride']}个")
+    if window.get('every'):
+        parts.append(f"每{window['every']}")
+    if window.get('max_count'):
+        parts.append(f"最多{window['max_count']}个")
+    return ' '.join(parts)
+
+
+class TimestampIndex:
+    """
+    文件夹内各数据文件的时间戳索引
+
+    参数:
+    folder: 数据文件夹
+    reader: 提供get_timestamp的读取器，默认为EisDataReader
+    scanner: 文件扫描器，默认按EIS扩展名过滤
+    index_file: 索引文件路径，默认为文件夹内的 .eis_timestamps.json
+    timestamp_func: 自定义的时间戳读取函数(路径 -> datetime)，给定时不使用reader
+    """
+    def __init__(self, folder: Union[Path, str], reader=None, scanner=None,
+                 index_file: Optional[Union[Path, str]] = None, timestamp_func=None):
+        self.folder = os.path.abspath(folder)
+        self.reader = reader
+        self.timestamp_func = timestamp_func
+        self.scanner = scanner if scanner is not None else FolderScanner()
+        if index_file is None:
+            index_file = (f'{self.folder}{INDEX_FILE}' if is_archive(self.folder)
+                          else os.path.join(self.folder, INDEX_FILE))
+        self.index_file = index_file
+        self.entries = {}  # 文件名 -> (大小, 修改时间ns, 时间戳或None)
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.entries = {name: (size, mtime, None if ts is None else datetime.fromisoformat(ts))
+                                for name, (size, mtime, ts) in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            print(f"Error loading timestamp index {self.index_file}: {e}")
+            self.entries = {}
+
+    def save(self) -> None:
+        tmp_file = f'{self.index_file}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({name: [size, mtime, None if ts is None else ts.isoformat()]
+                           for name, (size, mtime, ts) in self.entries.items()},
+                          f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except OSError as e:
+            # 只读文件夹中无法保存索引，不影响本次使用
+            print(f"Error saving timestamp index {self.index_file}: {e}")
+
+    def _ensure_reader(self):
+        if self.reader is None:
+            from fileload_all_eis import EisDataReader
+            self.reader = EisDataReader()
+        return self.reader
+
+    def read_timestamp(self, path: str) -> Optional[datetime]:
+        """读取单个文件的时间戳，无法识别的文件返回None"""
+        if self.timestamp_func is not None:
+            try:
+                return self.timestamp_func(path)
+            except Exception:
+                return None
+        self._ensure_reader()
+        try:
+            if path.lower().endswith('.mpr'):
+                mpr = self.reader.read_mpr(path)
+                dt = mpr.timestamp or mpr.startdate
+                return dt if isinstance(dt, datetime) else datetime.combine(dt, time())
+            return self.reader.get_timestamp(path)
+        except Exception:
+            return None
+
+    def update(self) -> int:
+        """扫描文件夹，只为新增或变化的文件读取时间戳，返回新读取的文件数"""
+        archive = is_archive(self.folder)
+        seen = set()
+        stale = {}  # 文件名 -> (路径, 大小, 修改时间ns)
+        for path, size, mtime in self.scanner.scan(self.folder):
+            # 压缩包成员以成员名(含压缩包内目录)为键
+            name = split_member(path)[1] if archive else os.path.basename(path)
+            seen.add(name)
+            entry = self.entries.get(name)
+            if entry is None or entry[:2] != (size, mtime):
+                stale[name] = (path, size, mtime)
+        if archive and stale and self.timestamp_func is None:
+            # 顺序读取一遍压缩包，避免逐个成员重新打开(压缩的tar需从头解压)
+            reader = self._ensure_reader()
+            for path, raw, mtime in iter_members(self.folder, list(stale)):
+                name = split_member(path)[1]
+                reader.prime(path, raw, mtime)
+                self.entries[name] = stale[name][1:] + (self.read_timestamp(path),)
+            reader.prime('', b'')
+        else:
+            for name, (path, size, mtime) in stale.items():
+                self.entries[name] = (size, mtime, self.read_timestamp(path))
+        removed = [name for name in self.entries if name not in seen]
+        for name in removed:
+            del self.entries[name]
+        if stale or removed:
+            self.save()
+        return len(stale)
+
+    def items(self) -> list:
+        """返回按时间排序的 [(文件名, 时间戳), ...]，不含无法识别的文件"""
+        items = [(name, entry[2]) for name, entry in self.entries.items() if entry[2] is not None]
+        return sorted(items, key=lambda x: x[1])
+
+    def select(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+               stride: Optional[int] = None, every: Optional[timedelta] = None,
+               max_count: Optional[int] = None) -> list:
+        """
+        按时间窗口选择谱，依次应用时间范围、步长、时间间隔和最大数量
+
+        参数:
+        start, end: 时间范围(含端点)
+        stride: 每隔stride个谱取一个
+        every: 每个时间间隔内取第一个谱
+        max_count: 在时间上均匀选取至多max_count个谱
+
+        返回:
+        list: 按时间排序的 [(文件名, 时间戳), ...]
+        """
+        items = self.items()
+        if start is not None:
+            items = [x for x in items if x[1] >= start]
+        if end is not None:
+            items = [x for x in items if x[1] <= end]
+        if stride and stride > 1:
+            items = items[::stride]
+        if not items:
+            return items
+
+        t = np.array([(x[1] - items[0][1]).total_seconds() for x in items])
+        if every is not None and every.total_seconds() > 0:
+            bins = np.floor(t / every.total_seconds())
+            keep = np.flatnonzero(np.diff(bins, prepend=-1) > 0)
+            items, t = [items[i] for i in keep], t[keep]
+        if max_count and len(items) > max_count:
+            # 离各目标时刻最近的谱，重复的只保留一次
+            targets = np.linspace(t[0], t[-1], max_count)
+            idx = np.clip(np.searchsorted(t, targets), 1, len(t) - 1)
+            idx = np.where(targets - t[idx - 1] <= t[idx] - targets, idx - 1, idx)
+            items = [items[i] for i in np.unique(idx)]
+        return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='建立文件夹的时间戳索引并按时间窗口选谱')
+    parser.add_argument('folder')
+    parser.add_argument('--start', default=None, help='开始时间，如 "2026-01-01 08:00"')
+    parser.add_argument('--end', default=None, help='结束时间')
+    parser.add_argument('--stride', type=int, default=None, help='每隔N个谱取一个')
+    parser.add_argument('--every', default=None, help='每个时间间隔取一个谱，如 30m、2h')
+    parser.add_argument('--max-count', type=int, default=None, help='最多选取的谱数')
+    args = parser.parse_args(argv)
+
+    index = TimestampIndex(args.folder)
+    n_read = index.update()
+    window = normalize_window(dict(start=args.start, end=args.end, stride=args.stride,
+                                   every=args.every, max_count=args.max_count))
+    selected = index.select(**window)
+    print(f"索引 {len(index.entries)} 个文件(新读取 {n_read} 个)，选中 {len(selected)} 个谱")
+    for name, timestamp in selected:
+        print(f"{timestamp.isoformat(sep=' ')}\t{name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+"""
+基于共享文件夹的多机DRT拟合任务队列，无需任何网络服务
+
+队列目录结构:
+    queue.json      队列配置(输出文件夹、拟合参数)
+    pending/        待处理任务清单
+    claimed/        已被领取的任务，文件名带worker标识，修改时间即租约心跳
+    done/           已完成任务清单
+    results/        每个任务的部分结果(.npz)
+
+用法:
+    python workqueue_eis.py submit 队列目录 文件夹或文件... [--lambda 10|cv] [--dop 10]
+    python workqueue_eis.py work 队列目录 [--processes 4]
+    python workqueue_eis.py merge 队列目录
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+import numpy as np
+from drt_pipeline import (FIXED_BASIS_TAU, FIT_LAMBDA_METHODS, fit_eis_tuple, predict_fit,
+                          resolve_lambdas, compute_ci, build_fit_tables, result_name, save_fit_tables)
+from drt_peaks import peak_table, save_peak_table
+from filescan import FolderScanner
+from archivesource import ARCHIVE_SEP, is_archive, split_member, join_source, normalize_path
+from archivesource import output_folder as source_output_folder
+from timeindex import TimestampIndex, normalize_window
+
+
+class WorkQueue:
+    """共享文件夹上的任务队列，任务领取依赖同一文件系统内os.rename的原子性"""
+    _subdirs = ('pending', 'claimed', 'done', 'results')
+
+    def __init__(self, queue_dir, lease_seconds=600.0):
+        self.queue_dir = os.path.abspath(queue_dir)
+        self.lease_seconds = lease_seconds
+        for sub in self._subdirs:
+            os.makedirs(os.path.join(self.queue_dir, sub), exist_ok=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.queue_dir, *parts)
+
+    def _write_json(self, path, obj):
+        """先写临时文件再替换，保证其他节点读不到半个文件"""
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _read_json(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @property
+    def config(self):
+        """队列配置"""
+        return self._read_json(self._path('queue.json'))
+
+    def now(self):
+        """以共享文件系统的时钟为准，避免各节点本地时钟不一致导致租约误判"""
+        clock = self._path('.clock')
+        with open(clock, 'a'):
+            os.utime(clock)
+        return os.stat(clock).st_mtime
+
+    # ---------------- 协调端 ----------------
+    def submit(self, items, iw_l2_lambda_0=10.0, fit_dop=False, dop_l2_lambda_0=10.0,
+               chunk_size=4, output_folder=None, time_window=None):
+        """
+        将文件夹或文件列表拆分为任务清单，返回任务数
+
+        items: 文件夹、压缩包(展开为其中的EIS文件)或单个文件(可为 压缩包::成员)
+        time_window: 给定时文件夹和压缩包中只提交时间窗口内选中的谱，参数同TimestampIndex.select
+        """
+        files = []
+        scanner = FolderScanner()
+        for item in items:
+            is_folder = os.path.isdir(item) or is_archive(item)
+            if is_folder and time_window:
+                index = TimestampIndex(item, scanner=scanner)
+                index.update()
+                files += [join_source(index.folder, name)
+                          for name, _ in index.select(**normalize_window(time_window))]
+            elif is_folder:
+                files += [normalize_path(p) for p in scanner.list_files(item)]
+            else:
+                # 压缩包成员只对压缩包部分取绝对路径
+                files.append(normalize_path(item))
+        files = list(dict.fromkeys(files))  # 同一文件重复给出时只拟合一次
+        if not files:
+            raise ValueError('未找到可处理的文件')
+        names = source_names(files)
+
+        if output_folder is None:
+            first = items[0]
+            if os.path.isdir(first) or is_archive(first):
+                output_folder = source_output_folder(first)  # 压缩包的结果写在压缩包旁边
+            else:
+                output_folder = os.path.dirname(os.path.abspath(split_member(first)[0]))
+        self._write_json(self._path('queue.json'), {
+            'output_folder': os.path.abspath(output_folder),
+            'params': {'iw_l2_lambda_0': iw_l2_lambda_0,
+                       'fit_dop': bool(fit_dop),
+                       'dop_l2_lambda_0': dop_l2_lambda_0},
+            'created': datetime.now().isoformat(),
+        })
+
+        n_jobs = 0
+        for start in range(0, len(files), chunk_size):
+            job_id = f'job{start // chunk_size:06d}'
+            self._write_json(self._path('pending', f'{job_id}.json'),
+                             {'job_id': job_id, 'files': files[start:start + chunk_size],
+                              'names': names[start:start + chunk_size]})
+            n_jobs += 1
+        return n_jobs
+
+    def status(self):
+        """各状态下的任务数"""
+        return {sub: len([f for f in os.listdir(self._path(sub)) if not f.endswith('.tmp')])
+                for sub in self._subdirs}
+
+    def requeue_expired(self):
+        """将租约过期(worker崩溃或失联)的任务放回待处理队列，返回放回的任务数"""
+        now = self.now()
+        n = 0
+        for f in os.listdir(self._path('claimed')):
+            claimed_path = self._path('claimed', f)
+            try:
+                if now - os.stat(claimed_path).st_mtime < self.lease_seconds:
+                    continue
+                job_id = f.split('@')[0]
+                os.rename(claimed_path, self._path('pending', f'{job_id}.json'))
+                n += 1
+            except FileNotFoundError:
+                continue  # 已被原worker完成或被其他节点放回
+        return n
+
+    # ---------------- worker端 ----------------
+    def claim(self, worker_id):
+        """原子地领取一个任务，返回(任务清单, 领取文件路径)，无任务时返回(None, None)"""
+        for f in sorted(os.listdir(self._path('pending'))):
+            if not f.endswith('.json'):
+                continue
+            job_id = f[:-len('.json')]
+            claimed_path = self._path('claimed', f'{job_id}@{worker_id}.json')
+            try:
+                os.rename(self._path('pending', f), claimed_path)
+            except FileNotFoundError:
+                continue  # 被其他worker抢先领取
+            os.utime(claimed_path)
+            # 崩溃前已写出结果的任务无需重算
+            if os.path.exists(self._path('results', f'{job_id}.npz')):
+                self.complete(job_id, claimed_path)
+                continue
+            return self._read_json(claimed_path), claimed_path
+        return None, None
+
+    def complete(self, job_id, claimed_path):
+        """标记任务完成；若租约已过期被放回，则结果仍然有效，忽略即可"""
+        try:
+            os.rename(claimed_path, self._path('done', f'{job_id}.json'))
+        except FileNotFoundError:
+            pass
+
+    def save_partial(self, job_id, names, timestamps, gamma, nu=None, dop=None, lambdas=None,
+                     ci=None):
+        """
+        保存单个任务的部分结果，lambdas为每个谱实际使用的(iw, dop) lambda，
+        ci为compute_ci返回的近似模型区间
+        """
+        tmp_path = self._path('results', f'{job_id}.{os.getpid()}.tmp.npz')
+        n_tau = len(FIXED_BASIS_TAU)
+        ci_arrays = {}
+        if ci and all(name in ci for name in names):
+            for key in ci[names[0]] if names else ():
+                ci_arrays[f'ci_{key}'] = np.array([ci[name][key] for name in names], dtype=float)
+        np.savez(tmp_path,
+                 names=np.array(names, dtype=str),
+                 timestamps=np.array(timestamps, dtype=str),
+                 gamma=np.array(gamma, dtype=float).reshape(len(names), n_tau),
+                 nu=np.array([] if nu is None else nu, dtype=float),
+                 dop=np.array([] if dop is None else dop, dtype=float),
+                 lambdas=np.array([] if lambdas is None else lambdas, dtype=float).reshape(-1, 2),
+                 **ci_arrays)
+        os.replace(tmp_path, self._path('results', f'{job_id}.npz'))
+
+    # ---------------- 合并 ----------------
+    def merge(self):
+        """将所有部分结果按时间排序后合并为标准的DRT_Fit_Results_*表格，返回结果文件名"""
+        status = self.status()
+        if status['pending'] or status['claimed']:
+            print(f"仍有未完成的任务: {status}")
+
+        config = self.config
+        params = config['params']
+        records = []
+        ci = {}
+        nu = None
+        for f in sorted(os.listdir(self._path('results'))):
+            if not f.endswith('.npz') or '.tmp' in f:
+                continue
+            with np.load(self._path('results', f)) as part:
+                if part['nu'].size:
+                    nu = part['nu']
+                for i, name in enumerate(part['names']):
+                    dop = part['dop'][i] if part['dop'].size else None
+                    lambdas = part['lambdas'][i] if part['lambdas'].size else (np.nan, np.nan)
+                    records.append((str(name), datetime.fromisoformat(str(part['timestamps'][i])),
+                                    part['gamma'][i], dop, lambdas))
+                    ci_keys = [k for k in part.files if k.startswith('ci_')]
+                    if ci_keys:
+                        ci[str(name)] = {k[3:]: part[k][i] for k in ci_keys}
+        if not records:
+            raise ValueError('没有可合并的结果')
+
+        data, data_dop, summary = build_fit_tables(records, nu, params['fit_dop'], ci)
+        plt_name = result_name(records[0][0], params['iw_l2_lambda_0'])
+        save_fit_tables(data, data_dop, config['output_folder'], plt_name, summary)
+        table = peak_table(np.vstack([r[2] for r in records]), FIXED_BASIS_TAU,
+                           [r[0] for r in records], [r[1] for r in records])
+        save_peak_table(table, config['output_folder'], plt_name)
+        return plt_name
+
+
+class _Heartbeat(threading.Thread):
+    """拟合期间定期刷新领取文件的修改时间，以续租"""
+    def __init__(self, claimed_path, interval):
+        super().__init__(daemon=True)
+        self.claimed_path = claimed_path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                os.utime(self.claimed_path)
+            except FileNotFoundError:
+                return  # 租约已被收回
+
+    def stop(self):
+        self.stopped.set()
+
+
+def source_names(paths):
+    """
+    各文件在结果表格中的列名: 相对于所有文件共同上级目录的路径，压缩包成员为 压缩包::成员名。
+    只提交一个文件夹时即为文件名；不同文件夹或压缩包内不同目录中的同名文件不会互相覆盖
+    """
+    archives = [os.path.abspath(split_member(p)[0]) for p in paths]
+    try:
+        root = os.path.commonpath([os.path.dirname(a) for a in archives])
+    except ValueError:
+        root = None  # Windows上不在同一驱动器，使用完整路径
+    names = []
+    for path, archive in zip(paths, archives):
+        name = archive if root is None else os.path.relpath(archive, root)
+        member = split_member(path)[1]
+        names.append(f'{name}{ARCHIVE_SEP}{member}' if member else name)
+    return names
+
+
+def process_job(job, params, reader, fit_func=fit_eis_tuple):
+    """
+    对任务中的每个文件执行 读取 → dual_fit_eis → 预测，返回部分结果
+
+    job['names']为各文件的列名(见source_names)，缺省时使用文件名
+    """
+    names, timestamps, gammas, dops, lambdas = [], [], [], [], []
+    eis_tups = {}
+    nu = None
+    for file_path, name in zip(job['files'],
+                               job.get('names') or [os.path.basename(p) for p in job['files']]):
+        try:
+            spectrum = reader.get_spectrum(file_path)
+            timestamp = spectrum.timestamp
+            if timestamp is None:
+                continue
+            eis_tup = spectrum.as_tuple()
+            iw_lambda, dop_lambda = resolve_lambdas(eis_tup, params['iw_l2_lambda_0'],
+                                                    params['dop_l2_lambda_0'], params['fit_dop'],
+                                                    fit_func=fit_func)
+            eis_drt = fit_func(eis_tup, iw_lambda, fit_dop=params['fit_dop'],
+                               dop_l2_lambda_0=dop_lambda)
+            gamma, nu_i, dop = predict_fit(eis_drt, params['fit_dop'])
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            continue
+        names.append(name)
+        eis_tups[names[-1]] = eis_tup
+        timestamps.append(timestamp.isoformat())
+        gammas.append(gamma)
+        lambdas.append((iw_lambda, dop_lambda if params['fit_dop'] else np.nan))
+        if dop is not None:
+            nu = nu_i
+            dops.append(dop)
+    # 近似模型的区间在任务内批量计算，合并时直接写入表格
+    try:
+        ci = compute_ci(eis_tups)
+    except Exception as e:
+        print(f"Error computing confidence intervals: {e}")
+        ci = None
+    return names, timestamps, gammas, nu, (dops or None), lambdas, ci
+
+
+def run_worker(queue_dir, worker_id=None, lease_seconds=600.0, poll_interval=5.0,
+               wait=False, fit_func=fit_eis_tuple):
+    """
+    worker主循环：领取任务并拟合，直到队列为空
+
+    参数:
+    wait: 为True时队列为空后继续等待新任务，否则所有任务完成后退出
+    fit_func: 单谱拟合函数，默认为hybdrt的dual_fit_eis流程
+    """
+    from fileload_all_eis import EisDataReader
+
+    if worker_id is None:
+        worker_id = f'{socket.gethostname()}-{os.getpid()}'
+    queue = WorkQueue(queue_dir, lease_seconds=lease_seconds)
+    params = queue.config['params']
+    reader = EisDataReader()
+    n_done = 0
+
+    while True:
+        queue.requeue_expired()
+        job, claimed_path = queue.claim(worker_id)
+        if job is None:
+            status = queue.status()
+            if not wait and not status['pending'] and not status['claimed']:
+                break
+            # 其他worker仍在运行时等待，以便在其崩溃后接手过期任务
+            time.sleep(poll_interval)
+            continue
+
+        heartbeat = _Heartbeat(claimed_path, lease_seconds / 3)
+        heartbeat.start()
+        try:
+            names, timestamps, gammas, nu, dops, lambdas, ci = process_job(job, params, reader,
+                                                                           fit_func)
+            queue.save_partial(job['job_id'], names, timestamps, gammas, nu, dops, lambdas, ci)
+        finally:
+            heartbeat.stop()
+        queue.complete(job['job_id'], claimed_path)
+        n_done += 1
+        print(f"[{worker_id}] 完成任务 {job['job_id']} ({len(names)}/{len(job['files'])} 个文件)")
+    return n_done
+
+
+def run_local_workers(queue_dir, processes, **kwargs):
+    """在本机启动多个worker进程，可用于无网络环境下的测试"""
+    workers = [multiprocessing.Process(target=run_worker, args=(queue_dir,), kwargs=kwargs)
+               for _ in range(processes)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+
+
+def _lambda_arg(value):
+    """lambda参数可以是数值，也可以是自动选择准则名称"""
+    if value in FIT_LAMBDA_METHODS:
+        return value
+    return float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='基于共享文件夹的多机DRT拟合任务队列')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_submit = sub.add_parser('submit', help='生成任务清单')
+    p_submit.add_argument('queue_dir')
+    p_submit.add_argument('items', nargs='+', help='文件夹或EIS文件')
+    p_submit.add_argument('--lambda', dest='iw_l2_lambda_0', type=_lambda_arg, default=10.0,
+                          help=f'数值或自动选择准则({"/".join(FIT_LAMBDA_METHODS)})')
+    p_submit.add_argument('--dop', dest='dop_l2_lambda_0', type=_lambda_arg, default=None,
+                          help='给定时开启DOP拟合')
+    p_submit.add_argument('--chunk', type=int, default=4, help='每个任务包含的文件数')
+    p_submit.add_argument('--output', default=None, help='结果输出文件夹')
+    p_submit.add_argument('--start', default=None, help='时间窗口开始，如 "2026-01-01 08:00"')
+    p_submit.add_argument('--end', default=None, help='时间窗口结束')
+    p_submit.add_argument('--stride', type=int, default=None, help='每隔N个谱取一个')
+    p_submit.add_argument('--every', default=None, help='每个时间间隔取一个谱，如 30m、2h')
+    p_submit.add_argument('--max-count', type=int, default=None, help='最多选取的谱数')
+
+    p_work = sub.add_parser('work', help='运行worker')
+    p_work.add_argument('queue_dir')
+    p_work.add_argument('--processes', type=int, default=1)
+    p_work.add_argument('--lease', type=float, default=600.0, help='租约时长(秒)')
+    p_work.add_argument('--wait', action='store_true', help='队列为空时继续等待新任务')
+
+    p_merge = sub.add_parser('merge', help='合并部分结果')
+    p_merge.add_argument('queue_dir')
+
+    p_status = sub.add_parser('status', help='查看队列状态')
+    p_status.add_argument('queue_dir')
+
+    args = parser.parse_args(argv)
+    if args.command == 'submit':
+        n = WorkQueue(args.queue_dir).submit(
+            args.items, args.iw_l2_lambda_0, fit_dop=args.dop_l2_lambda_0 is not None,
+            dop_l2_lambda_0=args.dop_l2_lambda_0 or 10.0, chunk_size=args.chunk,
+            output_folder=args.output,
+            time_window={k: v for k, v in dict(start=args.start, end=args.end, stride=args.stride,
+                                               every=args.every, max_count=args.max_count).items()
+                         if v is not None})
+        print(f"已生成 {n} 个任务")
+    elif args.command == 'work':
+        kwargs = dict(lease_seconds=args.lease, wait=args.wait)
+        if args.processes > 1:
+            run_local_workers(args.queue_dir, args.processes, **kwargs)
+        else:
+            run_worker(args.queue_dir, **kwargs)
+    elif args.command == 'merge':
+        print(f"已保存 {WorkQueue(args.queue_dir).merge()}")
+    else:
+        print(WorkQueue(args.queue_dir).status())
+
+
+if __name__ == "__main__":
+    main()
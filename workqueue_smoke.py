@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+任务队列的本机多进程冒烟测试
+
+在临时文件夹中生成合成的CHI格式谱: 两个子文件夹和一个zip压缩包的两个目录中放入同名文件，
+提交到队列，用run_local_workers启动多个worker进程拟合，合并后检查每个谱都有各自的一列、
+没有同名文件互相覆盖。默认用岭回归代替hybdrt拟合，无需安装hybdrt即可运行；
+--hybdrt 时使用正式的dual_fit_eis流程。
+
+用法:
+    python workqueue_smoke.py [--processes 3] [--per-folder 4] [--hybdrt] [--keep]
+"""
+
+import os
+import sys
+import shutil
+import zipfile
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+import numpy as np
+import drt_linear
+from drt_pipeline import FIXED_BASIS_TAU, fit_eis_tuple
+from workqueue_eis import WorkQueue, run_local_workers
+
+
+def chi_text(freq, z, timestamp):
+    """CHI工作站导出格式的文本"""
+    lines = [timestamp.strftime('%b. %d, %Y %H:%M:%S'), 'A.C. Impedance', '',
+             'Freq/Hz, Z\'/ohm, Z"/ohm, Z/ohm, Phase/deg']
+    for f, zi in zip(freq, z):
+        lines.append(f'{f:.4e}, {zi.real:.4e}, {zi.imag:.4e}, {abs(zi):.4e}, '
+                     f'{np.degrees(np.angle(zi)):.2f}')
+    return '\n'.join(lines) + '\n'
+
+
+def ridge_fit_tuple(eis_tup, iw_l2_lambda_0, fit_dop=False, dop_l2_lambda_0=10.0,
+                    fixed_basis_tau=FIXED_BASIS_TAU, eis_drt=None):
+    """与fit_eis_tuple签名相同的岭回归替身，lambda按岭回归自身的尺度使用"""
+    return drt_linear.fit_ridge_batch([eis_tup[0]], [eis_tup[1]], [iw_l2_lambda_0],
+                                      fixed_basis_tau)[0]
+
+
+def make_data(root, per_folder):
+    """生成测试数据，返回(提交的项目, 期望的列名)"""
+    freq = np.logspace(5, -1, 61)
+    omega = 2 * np.pi * freq
+    start = datetime(2025, 1, 1)
+    rng = np.random.default_rng(0)
+    items, expected, k = [], [], 0
+    archive = os.path.join(root, 'camp.zip')
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for folder in ('a', 'b', 'camp.zip::run1', 'camp.zip::run2'):
+            in_zip = folder.startswith('camp.zip::')
+            if not in_zip:
+                os.makedirs(os.path.join(root, folder))
+                items.append(os.path.join(root, folder))
+            for i in range(per_folder):
+                r_ct = 50 * (1 + 0.5 * rng.random())
+                z = 10 + r_ct / (1 + (1j * omega * 1e-3) ** 0.8)
+                text = chi_text(freq, z, start + timedelta(minutes=k))
+                k += 1
+                name = f'eis_{i}.txt'  # 各文件夹中的文件名相同
+                if in_zip:
+                    zf.writestr(f"{folder.split('::')[1]}/{name}", text)
+                    expected.append(f"{folder}/{name}")
+                else:
+                    with open(os.path.join(root, folder, name), 'w') as f:
+                        f.write(text)
+                    expected.append(os.path.join(folder, name))
+    items.append(archive)
+    return items, expected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='任务队列的本机多进程冒烟测试')
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--per-folder', type=int, default=4, help='每个文件夹中的谱数')
+    parser.add_argument('--hybdrt', action='store_true', help='使用hybdrt的dual_fit_eis拟合')
+    parser.add_argument('--keep', action='store_true', help='保留临时文件夹')
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix='eis_queue_smoke_')
+    try:
+        items, expected = make_data(root, args.per_folder)
+        queue_dir = os.path.join(root, 'queue')
+        queue = WorkQueue(queue_dir)
+        lam = 10.0 if args.hybdrt else 1e-3
+        n_jobs = queue.submit(items, lam, chunk_size=3, output_folder=os.path.join(root, 'out'))
+        os.makedirs(os.path.join(root, 'out'))
+        run_local_workers(queue_dir, args.processes, poll_interval=0.2,
+                          fit_func=fit_eis_tuple if args.hybdrt else ridge_fit_tuple)
+        status = queue.status()
+        plt_name = queue.merge()
+
+        import pandas as pd
+        data = pd.read_csv(os.path.join(root, 'out', f'{plt_name}.txt'), sep='\t')
+        summary = pd.read_csv(os.path.join(root, 'out', f'{plt_name}_summary.txt'), sep='\t')
+        columns = [c for c in data.columns if c != '0x' and not c.endswith('_ridge')]
+        missing = sorted(set(expected) - set(columns))
+        print(f"{n_jobs} 个任务，{args.processes} 个worker，状态 {status}")
+        print(f"合并表格 {len(columns)} 列，汇总 {len(summary)} 行，期望 {len(expected)} 个谱")
+        if missing or len(columns) != len(expected) or len(summary) != len(expected):
+            print(f"失败: 缺少 {missing}")
+            return 1
+        print("通过")
+        return 0
+    finally:
+        if args.keep:
+            print(f"临时文件夹: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())